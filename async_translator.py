@@ -0,0 +1,336 @@
+import asyncio
+import threading
+from concurrent.futures import CancelledError as FutureCancelledError
+
+try:
+    import httpx
+except ImportError:  # 未安装 httpx 时退回到线程池里执行同步请求
+    httpx = None
+
+try:
+    import h2  # noqa: F401  httpx 的 HTTP/2 支持依赖 h2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+from image_pipeline import PREPROCESS_STATS, ImageTranslation, as_encoded_image
+from translator_engines import Translator, ErrorText, is_error, MULTI_ENGINE_MODES
+
+async def _single_chunk(data):
+    yield data
+
+class AsyncTranslator:
+    """基于 asyncio 的引擎后端。
+
+    一个后台线程运行事件循环，按代理模式各持有一个 httpx.AsyncClient 连接池
+    （keep-alive，装有 h2 时启用 HTTP/2），竞速、批量、预取等并发请求不再各占一个线程。
+    请求构造、响应解析、缓存和耗时统计复用 Translator；translate / translate_image
+    等同步方法只是对协程的薄封装，接口与 Translator 一致，可直接替换。
+    """
+
+    def __init__(self, config, cache=None):
+        self.config = config
+        self.cache = cache
+        self.engines = Translator(config, cache=cache)  # 复用各引擎的构造/解析逻辑
+        self._clients = {}
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="engine-loop", daemon=True)
+        self._thread.start()
+
+    # ── 连接池 ──
+    def _client(self, mode):
+        """按代理模式返回 AsyncClient，只在事件循环线程中调用"""
+        if mode not in self._clients:
+            kwargs = {
+                "verify": False,
+                "http2": HTTP2_AVAILABLE,
+                "limits": httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60),
+            }
+            if mode == "manual":
+                kwargs["proxy"] = self.config.get("proxy_url", "http://127.0.0.1:7897")
+                kwargs["trust_env"] = False
+            else:
+                kwargs["trust_env"] = mode == "auto"
+            self._clients[mode] = httpx.AsyncClient(**kwargs)
+        return self._clients[mode]
+
+    def config_changed(self, changed):
+        """同 Translator.config_changed；代理地址变化时在事件循环中关闭 manual 模式的 AsyncClient"""
+        self.engines.config_changed(changed)
+        if "proxy_url" in changed:
+            async def _drop():
+                client = self._clients.pop("manual", None)
+                if client is not None:
+                    await client.aclose()
+            asyncio.run_coroutine_threadsafe(_drop(), self._loop)
+
+    async def _send(self, req):
+        if httpx is None:
+            return await asyncio.get_running_loop().run_in_executor(None, self.engines._send, req)
+        kwargs = {"params": req.params, "headers": req.headers, "timeout": req.timeout}
+        if req.json is not None:
+            kwargs["json"] = req.json
+        elif isinstance(req.data, dict):
+            kwargs["data"] = req.data
+        elif isinstance(req.data, (bytearray, memoryview)):
+            # 图片请求体：整块发送，不再复制成 bytes
+            kwargs["content"] = _single_chunk(req.data)
+            kwargs["headers"] = {**req.headers, "Content-Length": str(len(req.data))}
+        elif req.data is not None:
+            kwargs["content"] = req.data
+        url = self.engines._resolve_url(req.url)
+        self.engines._touch(url)
+        return await self._client(req.mode).request(req.method, url, **kwargs)
+
+    @property
+    def last_request(self):
+        return self.engines.last_request
+
+    def warm_up(self, engines, min_idle=0):
+        """同 Translator.warm_up，HEAD 请求在事件循环上并发发出"""
+        if httpx is None:
+            return self.engines.warm_up(engines, min_idle)
+        targets = self.engines.warm_targets(engines, min_idle)
+
+        async def head(origin, mode):
+            try:
+                await self._client(mode).head(origin, timeout=5)
+                self.engines._last_used[origin] = self._loop.time()
+            except Exception:
+                pass
+
+        async def run():
+            await asyncio.gather(*(head(origin, mode) for origin, mode in targets))
+        asyncio.run_coroutine_threadsafe(run(), self._loop).result()
+        return len(targets)
+
+    async def _execute(self, spec, payload, target_lang):
+        if spec is None:
+            return None
+        build, parse, label = spec
+        req = build(payload, target_lang)
+        if is_error(req):
+            return req
+        try:
+            return parse(await self._send(req))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return ErrorText(f"{label}: {str(e)}")
+
+    # ── 协程接口 ──
+    async def translate_async(self, text, target_lang="zh-CN", engine=None):
+        if not text:
+            return ErrorText("No text selected.")
+        if engine is None:
+            engine = self.config.get("engine", "google")
+        if engine in MULTI_ENGINE_MODES:
+            return await self._translate_multi(text, target_lang, engine)
+
+        t = self.engines
+        key = t._cache_key(text, target_lang, engine)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        start = self._loop.time()
+        try:
+            result = await self._execute(t._text_engine_spec(engine), text, target_lang)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return ErrorText(f"Error: {str(e)}")
+        if result is None:
+            return ErrorText("Unknown Engine")
+        if not is_error(result):
+            t._record_latency(engine, self._loop.time() - start)
+            if key is not None:
+                self.cache.put(key, result)
+        return result
+
+    async def translate_image_async(self, image_bytes, target_lang="zh-CN", engine=None):
+        if not image_bytes:
+            return ErrorText("No image provided.")
+        if engine is None:
+            engine = self.config.get("image_engine", "tencent")
+        t = self.engines
+        spec = t._image_engine_spec(engine)
+        if spec is None:
+            return ErrorText(f"引擎 {engine} 不支持图片翻译，请选择腾讯/AI")
+        # 哈希、解码/缩放/编码占用 CPU，放到线程池中执行，不阻塞事件循环
+        image = as_encoded_image(image_bytes)
+        cached = await self._loop.run_in_executor(None, t._image_cache_get, image, target_lang, engine)
+        if cached is not None:
+            return cached
+        layout = t._image_layout(image, engine)
+        if layout is not None:
+            targets = await self.translate_batch_async([r.source for r in layout.records], target_lang, engine)
+            result = t._retranslate_layout(layout, targets)
+            if result is not None:
+                t._image_cache_put(image, target_lang, engine, result)
+                return result
+        tiles = await self._loop.run_in_executor(None, t._image_tiles, image, engine)
+        if tiles:
+            return await self._translate_tiled_image(image, tiles, target_lang, engine)
+        data, info = await self._loop.run_in_executor(None, t.prepare_image, image, engine)
+        start = self._loop.time()
+        try:
+            result = await self._execute(spec, data, target_lang)
+            if info is not None:
+                PREPROCESS_STATS.record(info, self._loop.time() - start)
+                if isinstance(result, ImageTranslation):
+                    result = result.mapped(info["scale"], info["offset"])
+            t._image_cache_put(image, target_lang, engine, result)
+            return result
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return ErrorText(f"图片翻译失败: {str(e)}")
+
+    async def _translate_tiled_image(self, image, tiles, target_lang, engine):
+        """长截图分块翻译，切分和拼接规则同 Translator，各横条请求在事件循环上并发"""
+        t = self.engines
+        spec = t._image_engine_spec(engine)
+        semaphore = asyncio.Semaphore(max(1, int(self.config.get("image_tile_concurrency", 4))))
+
+        async def run(tile):
+            async with semaphore:
+                try:
+                    return await self._execute(spec, tile.data, target_lang)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    return ErrorText(f"图片翻译失败: {str(e)}")
+
+        results = await asyncio.gather(*(run(tile) for tile in tiles))
+        result = t._stitch_tiles(tiles, results)
+        t._image_cache_put(image, target_lang, engine, result)
+        return result
+
+    async def translate_batch_async(self, texts, target_lang="zh-CN", engine=None):
+        """批量翻译，分组规则同 Translator.translate_batch，各分组请求在事件循环上并发"""
+        if engine is None:
+            engine = self.config.get("engine", "google")
+        t = self.engines
+        results, chunks = t._plan_batch(texts, target_lang, engine)
+        spec = t._batch_engine_spec(engine)
+        semaphore = asyncio.Semaphore(max(1, int(self.config.get("batch_concurrency", 4))))
+
+        async def run(chunk):
+            async with semaphore:
+                if spec is None:
+                    return [await self.translate_async(chunk[0][0], target_lang, engine)]
+                try:
+                    result = await self._execute(spec, [item[0] for item in chunk], target_lang)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    result = ErrorText(f"Error: {str(e)}")
+                return t._check_batch_result(result, len(chunk), None)
+
+        done = await asyncio.gather(*(run(chunk) for chunk in chunks))
+        for chunk, chunk_results in zip(chunks, done):
+            t._fill_batch(results, chunk, chunk_results, target_lang, engine)
+        return results
+
+    async def _translate_multi(self, text, target_lang, mode):
+        """竞速/对冲，规则同 Translator._translate_multi；落选的请求以 task.cancel() 中断"""
+        t = self.engines
+        engines = t._race_engines()
+        if not engines:
+            return ErrorText("请在设置中配置竞速引擎列表")
+        if self.cache is not None:
+            for e in engines:
+                cached = self.cache.get(t._cache_key(text, target_lang, e))
+                if cached is not None:
+                    return cached
+
+        waiting = list(engines)
+        tasks = set()
+
+        def launch():
+            tasks.add(asyncio.ensure_future(self.translate_async(text, target_lang, waiting.pop(0))))
+
+        delay = t._hedge_delay(engines[0]) if mode == "hedge" else None
+        launch()
+        while mode == "race" and waiting:
+            launch()
+
+        last_error = None
+        try:
+            while tasks:
+                timeout = delay if mode == "hedge" and waiting else None
+                done, tasks = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    launch()  # 主引擎迟迟未返回，发出对冲请求
+                    continue
+                for task in done:
+                    result = task.result()
+                    if not is_error(result):
+                        return result
+                    last_error = result
+                    if waiting:
+                        launch()  # 失败时立即启用下一个引擎
+            return last_error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    # ── 同步封装（与 Translator 接口一致）──
+    def _run(self, coro, cancel):
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        if cancel is not None:
+            cancel.add_callback(future.cancel)
+        try:
+            return future.result()
+        except FutureCancelledError:
+            return ErrorText("翻译已取消")
+
+    def translate(self, text, target_lang="zh-CN", engine=None, cancel=None):
+        return self._run(self.translate_async(text, target_lang, engine), cancel)
+
+    def translate_image(self, image_bytes, target_lang="zh-CN", engine=None, cancel=None):
+        return self._run(self.translate_image_async(image_bytes, target_lang, engine), cancel)
+
+    def translate_batch(self, texts, target_lang="zh-CN", engine=None, cancel=None):
+        results = self._run(self.translate_batch_async(texts, target_lang, engine), cancel)
+        if is_error(results):  # 整批被取消
+            return [results] * len(texts)
+        return results
+
+    def supports_stream(self, engine):
+        return self.engines.supports_stream(engine)
+
+    def translate_stream(self, text, target_lang="zh-CN", engine=None, cancel=None, timing=None):
+        if engine is None:
+            engine = self.config.get("engine", "google")
+        if text and self.supports_stream(engine):
+            return self.engines.translate_stream(text, target_lang, engine, cancel, timing)  # SSE 流式仍走 requests
+        return self.engines._timed_single(lambda: self.translate(text, target_lang, engine, cancel), timing)
+
+    def translate_image_stream(self, image_bytes, target_lang="zh-CN", engine=None, cancel=None, timing=None):
+        if engine is None:
+            engine = self.config.get("image_engine", "tencent")
+        if image_bytes and self.supports_stream(engine):
+            return self.engines.translate_image_stream(image_bytes, target_lang, engine, cancel, timing)
+        return self.engines._timed_single(lambda: self.translate_image(image_bytes, target_lang, engine, cancel), timing)
+
+    def close(self):
+        """关闭所有连接池并停止事件循环"""
+        async def _close():
+            for client in self._clients.values():
+                await client.aclose()
+            self._clients.clear()
+        try:
+            asyncio.run_coroutine_threadsafe(_close(), self._loop).result(timeout=5)
+        except Exception:
+            pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self.engines.close()
+
+def create_translator(config, cache=None):
+    """根据 engine_backend 配置创建翻译器：async 使用 asyncio 后端，否则使用 requests 同步后端"""
+    if config.get("engine_backend", "requests") == "async":
+        return AsyncTranslator(config, cache=cache)
+    return Translator(config, cache=cache)
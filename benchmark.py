@@ -0,0 +1,279 @@
+"""离线性能基准：启动本地模拟服务商（mock_providers.py），把各引擎指向它，
+按引擎和模式统计 p50/p95/p99 延迟、吞吐量和内存峰值，无需网络和真实密钥。
+
+    python benchmark.py
+    python benchmark.py --engines google,deepl --modes single,batch --latency 20 --jitter 5
+    python benchmark.py --backend async --json bench.json
+    python benchmark.py --baseline bench.json     # 与基线比较，退化超过阈值时返回 1
+
+模式：
+    single      逐条顺序翻译
+    batch       translate_batch，每次 --batch-size 段
+    cached      缓存预热后再次翻译同样的文本
+    concurrent  --concurrency 个线程同时逐条翻译
+    image       图片翻译（仅腾讯/AI），随机字节，大小为 --image-kb，不经过预处理
+    screenshot  图片翻译（仅腾讯/AI），合成的 --screenshot-size 截图 PNG，经过预处理
+                （加 --no-preprocess 可对比不预处理时的耗时）
+
+reuse 列为 requests 后端复用已有连接的请求比例；saved / prep ms 列为图片预处理节省的上传字节
+比例和每张图片的平均预处理耗时。
+"""
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageDraw
+
+from async_translator import create_translator
+from config_manager import DEFAULT_CONFIG
+from image_pipeline import PREPROCESS_STATS
+from mock_providers import endpoint_overrides
+from translation_cache import TranslationCache
+from translator_engines import CONNECTION_STATS, TEXT_ENGINES, is_error
+
+MODES = ("single", "batch", "cached", "concurrent", "image", "screenshot")
+IMAGE_ENGINES = ("tencent", "ai")
+
+def bench_config(url, backend):
+    """指向模拟服务 url 的配置，填入占位密钥并关闭代理"""
+    config = dict(DEFAULT_CONFIG)
+    config.update({
+        "engine_backend": backend,
+        "endpoint_overrides": endpoint_overrides(url),
+        "ai_endpoint": url + "/v1",
+        "ai_stream": False,
+        "deepl_api_key": "bench",
+        "microsoft_api_key": "bench",
+        "tencent_secret_id": "bench",
+        "tencent_secret_key": "bench",
+        "volcano_access_key": "bench",
+        "volcano_secret_key": "bench",
+        "ai_api_key": "bench",
+    })
+    for engine in TEXT_ENGINES:
+        config[f"{engine}_proxy_mode"] = "direct"
+    return config
+
+def start_mock_process(args):
+    """在子进程中运行模拟服务，使其内存分配不计入 tracemalloc 峰值；返回 (进程, 地址)"""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_providers.py")
+    proc = subprocess.Popen([sys.executable, script, "--latency", str(args.latency), "--jitter", str(args.jitter),
+                             "--error-rate", str(args.error_rate), "--response-scale", str(args.response_scale),
+                             "--seed", str(args.seed)], stdout=subprocess.PIPE, text=True)
+    url = proc.stdout.readline().strip()
+    if not url:
+        proc.kill()
+        raise SystemExit("模拟服务启动失败")
+    return proc, url
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def sample_texts(prefix, count, size):
+    """生成 count 条互不相同、约 size 个字符的英文文本"""
+    words = "the quick brown fox jumps over a lazy dog while reading selected text".split()
+    texts = []
+    for i in range(count):
+        parts = [f"{prefix}-{i}"]
+        while sum(len(p) + 1 for p in parts) < size:
+            parts.append(words[(i + len(parts)) % len(words)])
+        texts.append(" ".join(parts))
+    return texts
+
+def synthetic_screenshot(size):
+    """生成一张类似文档截图的 PNG：浅色背景、边框、标题栏和多行文字"""
+    w, h = size
+    img = Image.new("RGB", (w, h), (243, 243, 243))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((w // 8, h // 10, w * 7 // 8, h * 9 // 10), fill=(255, 255, 255), outline=(200, 200, 200))
+    draw.rectangle((w // 8, h // 10, w * 7 // 8, h // 10 + 40), fill=(45, 90, 160))
+    texts = sample_texts("line", max(1, (h * 8 // 10 - 60) // 22), 120)
+    for i, text in enumerate(texts):
+        draw.text((w // 8 + 20, h // 10 + 60 + i * 22), text, fill=(30, 30, 30))
+    out = io.BytesIO()
+    img.save(out, "PNG")
+    return out.getvalue()
+
+def _workload(translator, engine, mode, prefix, args):
+    """返回 [(调用, 段数)]，每个调用即一次计时的操作"""
+    target = args.target
+    if mode == "image":
+        images = [os.urandom(args.image_kb * 1024) for _ in range(args.requests)]
+        return [(lambda img=img: translator.translate_image(img, target, engine=engine), 1) for img in images]
+    if mode == "screenshot":
+        image = synthetic_screenshot(args.screenshot_size)
+        return [(lambda: translator.translate_image(image, target, engine=engine), 1)] * args.requests
+    texts = sample_texts(prefix, args.requests, args.text_size)
+    if mode == "batch":
+        size = args.batch_size
+        chunks = [texts[i:i + size] for i in range(0, len(texts), size)]
+        return [(lambda c=c: translator.translate_batch(c, target, engine=engine), len(c)) for c in chunks]
+    return [(lambda t=t: translator.translate(t, target, engine=engine), 1) for t in texts]
+
+def _run_ops(ops, concurrency):
+    """执行全部操作，返回 (各操作耗时, 总耗时, 失败段数)"""
+    def timed(op):
+        fn, _ = op
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        results = result if isinstance(result, list) else [result]
+        return elapsed, sum(1 for r in results if is_error(r))
+
+    start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            done = list(pool.map(timed, ops))
+    else:
+        done = [timed(op) for op in ops]
+    wall = time.perf_counter() - start
+    return [d[0] for d in done], wall, sum(d[1] for d in done)
+
+def bench_one(config, engine, mode, args):
+    cache = TranslationCache(None, max_memory=args.requests * 4) if mode == "cached" else None
+    translator = create_translator(config, cache=cache)
+    concurrency = args.concurrency if mode == "concurrent" else 1
+    try:
+        # 预热连接池，不计入统计
+        translator.translate("warm up", args.target, engine=engine)
+        ops = _workload(translator, engine, mode, f"{mode}-timed", args)
+        if mode == "cached":
+            _run_ops(ops, 1)
+        CONNECTION_STATS.reset()
+        PREPROCESS_STATS.reset()
+        latencies, wall, errors = _run_ops(ops, concurrency)
+        segments = sum(n for _, n in ops)
+        connections = CONNECTION_STATS.snapshot()
+        preprocess = PREPROCESS_STATS.snapshot()
+
+        # 单独跑一轮统计内存峰值，避免 tracemalloc 的开销影响延迟数据
+        ops = _workload(translator, engine, mode, f"{mode}-alloc", args)
+        if mode == "cached":
+            _run_ops(ops, 1)
+        tracemalloc.start()
+        _run_ops(ops, concurrency)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        translator.close()
+    return {
+        "engine": engine,
+        "mode": mode,
+        "backend": config["engine_backend"],
+        "ops": len(latencies),
+        "segments": segments,
+        "errors": errors,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "throughput": segments / wall if wall else 0.0,
+        "peak_kib": peak / 1024,
+        # 连接复用率只统计 requests 后端
+        "reuse": connections["reuse_ratio"] if config["engine_backend"] == "requests" else None,
+        # 图片预处理节省的上传字节比例与每张图片的平均预处理耗时，未预处理时为 None
+        "saved": preprocess["saved_ratio"] if preprocess["images"] else None,
+        "preprocess_ms": preprocess["preprocess_ms"] if preprocess["images"] else None,
+    }
+
+def print_table(rows, out):
+    header = f"{'engine':<10} {'mode':<11} {'backend':<8} {'ops':>5} {'err':>4} " \
+             f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'seg/s':>9} {'peak KiB':>9} {'reuse':>6} {'saved':>6} {'prep ms':>8}"
+    print(header, file=out)
+    print("-" * len(header), file=out)
+    for r in rows:
+        print(f"{r['engine']:<10} {r['mode']:<11} {r['backend']:<8} {r['ops']:>5} {r['errors']:>4} "
+              f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['throughput']:>9.1f} "
+              f"{r['peak_kib']:>9.1f} {'-' if r.get('reuse') is None else format(r['reuse'], '.0%'):>6} "
+              f"{'-' if r.get('saved') is None else format(r['saved'], '.0%'):>6} "
+              f"{'-' if r.get('preprocess_ms') is None else format(r['preprocess_ms'], '.1f'):>8}", file=out)
+
+def compare_baseline(rows, baseline, threshold, out):
+    """p50 延迟或吞吐量比基线差超过 threshold（比例）时视为退化，返回退化条目数"""
+    previous = {(r["engine"], r["mode"], r["backend"]): r for r in baseline}
+    regressions = 0
+    for r in rows:
+        old = previous.get((r["engine"], r["mode"], r["backend"]))
+        if old is None:
+            continue
+        slower = old["p50_ms"] and r["p50_ms"] > old["p50_ms"] * (1 + threshold)
+        weaker = old["throughput"] and r["throughput"] < old["throughput"] * (1 - threshold)
+        if slower or weaker:
+            regressions += 1
+            print(f"退化: {r['engine']}/{r['mode']}/{r['backend']} "
+                  f"p50 {old['p50_ms']:.2f} -> {r['p50_ms']:.2f} ms, "
+                  f"吞吐 {old['throughput']:.1f} -> {r['throughput']:.1f} seg/s", file=out)
+    return regressions
+
+def _split(value, choices, name):
+    items = [v.strip() for v in value.split(",") if v.strip()]
+    unknown = [v for v in items if v not in choices]
+    if unknown:
+        raise SystemExit(f"未知的{name}: {', '.join(unknown)}")
+    return items
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="翻译引擎离线性能基准")
+    p.add_argument("--engines", default=",".join(TEXT_ENGINES), help="逗号分隔的引擎列表")
+    p.add_argument("--modes", default=",".join(MODES), help="逗号分隔的模式列表")
+    p.add_argument("--backend", default="requests", help="requests、async 或 requests,async")
+    p.add_argument("--requests", type=int, default=100, help="每个模式的请求（文本段）数")
+    p.add_argument("--concurrency", type=int, default=8, help="concurrent 模式的线程数")
+    p.add_argument("--batch-size", type=int, default=20, help="batch 模式每次的段数")
+    p.add_argument("--text-size", type=int, default=200, help="每段文本的字符数")
+    p.add_argument("--image-kb", type=int, default=256, help="image 模式的图片大小（KiB）")
+    p.add_argument("--screenshot-size", default="2560x1440", help="screenshot 模式的截图尺寸")
+    p.add_argument("--no-preprocess", action="store_true", help="关闭截图预处理")
+    p.add_argument("--target", default="zh-CN", help="目标语言")
+    p.add_argument("--latency", type=float, default=20, help="模拟服务的处理耗时（毫秒）")
+    p.add_argument("--jitter", type=float, default=5, help="耗时抖动（毫秒）")
+    p.add_argument("--error-rate", type=float, default=0.0, help="模拟失败的概率")
+    p.add_argument("--response-scale", type=int, default=1, help="译文相对原文的放大倍数")
+    p.add_argument("--seed", type=int, default=1, help="随机种子")
+    p.add_argument("--json", help="把结果写入 JSON 文件")
+    p.add_argument("--baseline", help="与之前 --json 保存的结果比较")
+    p.add_argument("--threshold", type=float, default=0.2, help="判定退化的比例（默认 0.2）")
+    args = p.parse_args(argv)
+
+    engines = _split(args.engines, TEXT_ENGINES, "引擎")
+    modes = _split(args.modes, MODES, "模式")
+    backends = _split(args.backend, ("requests", "async"), "后端")
+    args.screenshot_size = tuple(int(v) for v in args.screenshot_size.lower().split("x"))
+
+    proc, url = start_mock_process(args)
+    rows = []
+    try:
+        for backend in backends:
+            config = bench_config(url, backend)
+            if args.no_preprocess:
+                config["image_preprocess"] = {e: {"enabled": False} for e in IMAGE_ENGINES}
+            for engine in engines:
+                for mode in modes:
+                    if mode in ("image", "screenshot") and engine not in IMAGE_ENGINES:
+                        continue
+                    rows.append(bench_one(config, engine, mode, args))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    print_table(rows, sys.stdout)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare_baseline(rows, baseline, args.threshold, sys.stdout):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
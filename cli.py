@@ -0,0 +1,183 @@
+"""命令行批量翻译（无需 GUI，可在 Linux 上运行）
+
+用法示例：
+    python cli.py glossary.txt -o glossary.zh.txt
+    python cli.py docs.jsonl --format jsonl --field text --engine deepl --target en
+    cat lines.txt | python cli.py - --concurrency 8 > out.txt
+    python cli.py big.txt -o big.zh.txt --checkpoint big.ckpt   # 中断后重复执行即可续传
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from config_manager import load_config
+from translation_cache import open_cache
+from async_translator import create_translator
+from translator_engines import is_error
+
+def _read_chunks(stream, size, skip):
+    """跳过前 skip 行后，每次读出 size 行（去掉行尾换行符）"""
+    chunk = []
+    for lineno, line in enumerate(stream):
+        if lineno < skip:
+            continue
+        chunk.append(line.rstrip("\r\n"))
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _load_checkpoint(path, source):
+    """返回 (已完成行数, 输出文件此时的长度或 None)"""
+    if not path or not os.path.exists(path):
+        return 0, None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return 0, None
+    if data.get("source") != source:
+        return 0, None
+    return data.get("done", 0), data.get("offset")
+
+def _save_checkpoint(path, source, done, offset):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"source": source, "done": done, "offset": offset}, f)
+    os.replace(tmp, path)
+
+def _parse_record(line, field):
+    """解析一行 JSONL，返回 (记录, 待翻译文本, 错误)；空行的记录为 None，待翻译字段不是字符串时也视为错误"""
+    if not line.strip():
+        return None, "", None
+    try:
+        record = json.loads(line)
+    except json.JSONDecodeError as e:
+        return {"raw": line}, "", f"invalid JSON: {e}"
+    if not isinstance(record, dict):
+        return {"raw": line}, "", "invalid JSON: not an object"
+    text = record.get(field, "")
+    if not isinstance(text, str):
+        return record, "", f"field {field!r} is not a string"
+    return record, text, None
+
+class _Progress:
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.start = time.perf_counter()
+        self.done = 0
+        self.errors = 0
+
+    def update(self, count, errors):
+        self.done += count
+        self.errors += errors
+        if self.enabled:
+            rate = self.done / max(time.perf_counter() - self.start, 1e-6)
+            sys.stderr.write(f"\r已翻译 {self.done} 条，失败 {self.errors} 条，{rate:.1f} 条/秒")
+            sys.stderr.flush()
+
+    def finish(self):
+        if self.enabled:
+            sys.stderr.write("\n")
+
+def translate_stream(translator, args, stream, out, source, progress):
+    """逐块翻译一个输入流，每块写完后更新检查点。
+
+    检查点同时记录输出文件的长度，续传时先截断到该长度，写完输出但未更新检查点时
+    被中断的那一块不会重复写入；输出到标准输出时无法截断，这一块可能重复。
+    """
+    seekable = out is not sys.stdout
+    done, offset = _load_checkpoint(args.checkpoint, source)
+    if done:
+        if seekable and offset is not None:
+            out.truncate(offset)
+        if progress.enabled:
+            sys.stderr.write(f"从第 {done + 1} 行继续\n")
+    for lines in _read_chunks(stream, args.chunk_size, done):
+        if args.format == "jsonl":
+            parsed = [_parse_record(line, args.field) for line in lines]
+            texts = [text for _, text, _ in parsed]
+        else:
+            parsed, texts = None, lines
+        results = translator.translate_batch(texts, args.target, engine=args.engine)
+        errors = 0
+        for i, result in enumerate(results):
+            if args.format == "jsonl":
+                record, _, parse_error = parsed[i]
+                if record is None:
+                    out.write("\n")
+                    continue
+                if parse_error is not None:
+                    result = parse_error
+                    failed = True
+                else:
+                    failed = is_error(result)
+                record[args.error_field if failed else args.output_field] = result
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            else:
+                failed = is_error(result)
+                out.write(("" if failed else result).replace("\n", " ") + "\n")
+            errors += failed
+        out.flush()
+        done += len(lines)
+        if args.checkpoint:
+            _save_checkpoint(args.checkpoint, source, done, out.tell() if seekable else None)
+        progress.update(len(lines), errors)
+
+def build_parser():
+    p = argparse.ArgumentParser(description="使用划词翻译的引擎和配置批量翻译文本文件、JSONL 或标准输入")
+    p.add_argument("inputs", nargs="*", default=["-"], help="输入文件，- 表示标准输入（默认）")
+    p.add_argument("-o", "--output", help="输出文件（默认标准输出）；续传时以追加方式写入")
+    p.add_argument("--format", choices=["text", "jsonl"], default="text", help="text：每行一段；jsonl：每行一个 JSON 对象")
+    p.add_argument("--field", default="text", help="jsonl 模式下待翻译的字段")
+    p.add_argument("--output-field", default="translation", help="jsonl 模式下写入译文的字段")
+    p.add_argument("--error-field", default="error", help="jsonl 模式下写入错误信息的字段")
+    p.add_argument("--engine", help="翻译引擎（默认使用配置中的 engine）")
+    p.add_argument("--target", default="zh-CN", choices=["zh-CN", "en"], help="目标语言")
+    p.add_argument("--config", help="配置文件路径（默认与程序同目录的 config.json）")
+    p.add_argument("--concurrency", type=int, help="同时发出的请求数（覆盖 batch_concurrency）")
+    p.add_argument("--chunk-size", type=int, default=200, help="每次提交给 translate_batch 的行数，也是检查点粒度")
+    p.add_argument("--checkpoint", help="检查点文件；中断后用相同参数重新执行即可从上次位置继续")
+    p.add_argument("--no-cache", action="store_true", help="不读写翻译缓存")
+    p.add_argument("-q", "--quiet", action="store_true", help="不输出进度")
+    return p
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.checkpoint and len(args.inputs) > 1:
+        sys.exit("--checkpoint 只能用于单个输入")
+    config = load_config(args.config)
+    if args.concurrency:
+        config["batch_concurrency"] = args.concurrency
+    cache = None if args.no_cache else open_cache(config)
+    translator = create_translator(config, cache=cache)
+    progress = _Progress(not args.quiet)
+
+    resuming = args.checkpoint and os.path.exists(args.checkpoint)
+    out = open(args.output, "a" if resuming else "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for path in args.inputs:
+            if path == "-":
+                translate_stream(translator, args, sys.stdin, out, "-", progress)
+            else:
+                with open(path, "r", encoding="utf-8") as f:
+                    translate_stream(translator, args, f, out, os.path.abspath(path), progress)
+    except KeyboardInterrupt:
+        progress.finish()
+        sys.exit(130)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        translator.close()
+        if cache is not None:
+            cache.close()
+    progress.finish()
+    if args.checkpoint and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)  # 全部完成后删除检查点
+    return 1 if progress.errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
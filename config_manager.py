@@ -2,6 +2,8 @@ import json
 import os
 import sys
 
+from history_store import HistoryDatabase, HistoryLog
+
 # 获取程序所在目录（支持 PyInstaller 打包）
 def get_app_dir():
     if getattr(sys, 'frozen', False):
@@ -41,50 +43,177 @@ DEFAULT_CONFIG = {
     "ai_model": "gpt-3.5-turbo",
     "ai_prompt": "You are a professional translator. Translate the following text to Chinese, maintaining the original tone and context: ",
     "ai_proxy_mode": "direct",
+    "ai_stream": True,  # AI 引擎使用流式输出
+    "ai_image_max_tokens": 4096,  # AI 图片翻译单次请求的输出上限
     
+    # 多引擎竞速/对冲：按优先级排列的引擎列表，对冲延迟在样本不足时的默认值
+    "race_engines": ["google", "microsoft", "volcano"],
+    "hedge_delay_ms": 1000,
+    "engine_backend": "requests",  # requests 同步后端 / async 异步后端（需安装 httpx）
+    "batch_concurrency": 4,  # 批量翻译时同时发出的请求数
+    "endpoint_overrides": {},  # 服务商域名 -> 替代地址，压测时指向本地模拟服务
+    # 连接预热：启动和改设置后预先连接默认引擎；空闲 keepalive_interval 秒后发请求保持连接，
+    # 超过 keepalive_idle_limit 秒没有翻译则暂停保活
+    "prewarm_connections": True,
+    "keepalive_interval": 45,
+    "keepalive_idle_limit": 600,
+    # 截图上传前的预处理，按引擎覆盖 image_pipeline.ENGINE_DEFAULTS，如 {"ai": {"formats": ["png"]}}
+    "image_preprocess": {},
+    # 长截图分块翻译：超过该高度（像素）时切成相互重叠的横条并发请求，0 表示不分块
+    "image_tile_height": 2000,
+    "image_tile_overlap": 120,
+    "image_tile_concurrency": 4,
+
+    # 本地 HTTP 翻译服务（仅监听 127.0.0.1）
+    "server_enabled": False,
+    "server_port": 8765,
+
+    # 推测翻译：划词图标出现时就在后台翻译并写入缓存，点击图标时直接显示结果（默认关闭）。
+    # speculative_daily_chars 为收费引擎每天用于推测翻译的字符上限，未列出的引擎不限制
+    "speculative_translation": False,
+    "speculative_max_chars": 2000,
+    "speculative_daily_chars": {"deepl": 20000, "microsoft": 20000, "tencent": 20000, "volcano": 20000, "ai": 10000},
+    # 预取：首个结果显示后在后台翻译另一种目标语言，以及 prefetch_engine（为空则不预取其它引擎）的译文，
+    # 弹窗中切换语言/引擎时直接命中缓存；与推测翻译共用每日字符预算（默认关闭）
+    "prefetch_alternates": False,
+    "prefetch_engine": "",
+
     "show_icon_delay": 0.5,
     "proxy_url": "http://127.0.0.1:7897",
     "auto_start": False,
     "custom_icon_path": "",
-    "history_max_count": 10
+    "history_max_count": 10,
+    "history_backend": "jsonl",  # jsonl 追加写入的文件 / sqlite 带全文搜索的数据库，适合保留大量记录（保留超过 1000 条时总是使用）
+
+    # 翻译结果缓存
+    "cache_enabled": True,
+    "cache_memory_size": 512,
+    "cache_disk_size": 5000,
+    "cache_max_age_days": 30,
+    "image_cache_distance": 4  # 图片感知哈希（256 位）汉明距离不超过该值时复用结果，0 表示只精确匹配
 }
 
-def load_config():
-    if os.path.exists(CONFIG_FILE):
+def load_config(path=None):
+    """读取配置并补全默认值；文件损坏时改名为 .corrupt 保留，返回默认配置"""
+    path = path or CONFIG_FILE
+    if os.path.exists(path):
         try:
-            with open(CONFIG_FILE, "r", encoding="utf-8") as f:
+            with open(path, "r", encoding="utf-8") as f:
                 data = json.load(f)
+            if isinstance(data, dict):
                 return {**DEFAULT_CONFIG, **data}
-        except:
+        except OSError:
             return DEFAULT_CONFIG.copy()
+        except ValueError:
+            pass
+        try:
+            os.replace(path, path + ".corrupt")  # 保留损坏的文件，避免下次保存时被默认配置覆盖
+        except OSError:
+            pass
     return DEFAULT_CONFIG.copy()
 
-def save_config(config):
-    with open(CONFIG_FILE, "w", encoding="utf-8") as f:
+def save_config(config, path=None):
+    """先写入临时文件再原子替换，写入中途崩溃不会损坏原有配置"""
+    path = path or CONFIG_FILE
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
         json.dump(config, f, indent=4, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+class ConfigStore:
+    """进程内唯一的配置对象。data 为配置 dict，翻译器等直接持有并实时读取；
+    update() 只在确有变化时原地修改并保存，然后把变化的键通知订阅者，
+    由各部分只重建受影响的状态（如代理地址变化时只重建 manual 模式的连接池）。"""
+
+    def __init__(self, path=None):
+        self.path = path or CONFIG_FILE
+        self.data = load_config(self.path)
+        self._listeners = []
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def subscribe(self, callback):
+        """callback(changed) 在配置变化后调用，changed 为变化的键组成的 set"""
+        self._listeners.append(callback)
+
+    def update(self, values):
+        """合并新配置，返回变化的键；没有变化时不写文件、不通知"""
+        changed = {k for k, v in values.items() if k not in self.data or self.data[k] != v}
+        if not changed:
+            return changed
+        self.data.update({k: values[k] for k in changed})
+        save_config(self.data, self.path)
+        for callback in list(self._listeners):
+            callback(changed)
+        return changed
 
 # ── 翻译历史记录 ──
-HISTORY_FILE = os.path.join(get_app_dir(), "history.json")
+# 默认为追加写入的 JSONL 文件，history_backend 为 "sqlite" 时使用带全文索引的数据库，
+# 写入均在后台线程进行，见 history_store
+HISTORY_FILE = os.path.join(get_app_dir(), "history.jsonl")
+HISTORY_DB_FILE = os.path.join(get_app_dir(), "history.db")
+LEGACY_HISTORY_FILE = os.path.join(get_app_dir(), "history.json")  # 旧版每次整体重写的 JSON 数组
 
-def load_history():
-    """加载翻译历史记录"""
-    if os.path.exists(HISTORY_FILE):
-        try:
-            with open(HISTORY_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except:
-            return []
-    return []
+_history = HistoryLog(HISTORY_FILE, legacy_path=LEGACY_HISTORY_FILE)
+
+def configure_history(config):
+    """按配置切换历史记录后端（切换前写完排队中的记录）并更新保留数量。
+    保留数量超过 HistoryLog.MAX_COUNT 时 JSONL 的搜索和计数要扫描整个文件，此时总是使用 SQLite。"""
+    global _history
+    max_count = config.get("history_max_count", 10)
+    if config.get("history_backend", "jsonl") == "sqlite" or max_count > HistoryLog.MAX_COUNT:
+        store = HistoryDatabase
+    else:
+        store = HistoryLog
+    if not isinstance(_history, store):
+        _history.flush()
+        old = _history
+        if store is HistoryDatabase:
+            _history = HistoryDatabase(HISTORY_DB_FILE, max_count, import_path=HISTORY_FILE)
+        else:
+            _history = HistoryLog(HISTORY_FILE, max_count, legacy_path=LEGACY_HISTORY_FILE)
+        _carry_over(old, _history, max_count)
+    _history.set_max_count(max_count)
+
+def _history_key(record):
+    return record.get("time", ""), record.get("source", ""), record.get("result", "")
+
+def _carry_over(old, new, max_count):
+    """把旧后端中不早于新后端最新记录、且新后端还没有的记录追加过去（来回切换后端时不丢记录）。
+    时间只精确到秒，与最新记录同一秒的记录按 (时间, 原文, 译文) 去重。"""
+    latest = new.tail(1)
+    since = latest[0].get("time", "") if latest else ""
+    existing = {_history_key(r) for r in new.query(since=since, limit=max_count)} if since else set()
+    newer = [r for r in old.tail(max_count) if r.get("time", "") >= since and _history_key(r) not in existing]
+    for record in reversed(newer):
+        new.append(record, max_count)
+
+def load_history(limit=None):
+    """加载最新的 limit 条翻译历史记录（默认为最近一次写入时的保留数量），最新的在前"""
+    return _history.tail(limit)
+
+def search_history(text="", engine=None, target_lang=None, limit=50, offset=0):
+    """按原文/译文中的文字、引擎、目标语言分页查询历史记录，最新的在前"""
+    return _history.query(text, engine=engine, target_lang=target_lang, limit=limit, offset=offset)
+
+def count_history(text="", engine=None, target_lang=None):
+    """符合条件的历史记录数"""
+    return _history.count(text, engine=engine, target_lang=target_lang)
 
 def save_history(history):
-    """保存翻译历史记录"""
-    with open(HISTORY_FILE, "w", encoding="utf-8") as f:
-        json.dump(history, f, indent=2, ensure_ascii=False)
+    """用 history（最新的在前）替换全部翻译历史记录"""
+    _history.replace(history)
+
+def flush_history():
+    """等待历史记录写入磁盘，退出前调用"""
+    _history.flush()
 
 def add_history_record(source, result, engine, target_lang, is_image=False, max_count=10):
-    """添加一条翻译历史记录，超过 max_count 时自动移除最旧的"""
+    """添加一条翻译历史记录（只追加一行，不读取已有记录），超过 max_count 的旧记录在压缩时移除"""
     from datetime import datetime as _dt
-    history = load_history()
     record = {
         "time": _dt.now().strftime("%Y-%m-%d %H:%M:%S"),
         "source": source if not is_image else "[图片翻译]",
@@ -93,8 +222,5 @@ def add_history_record(source, result, engine, target_lang, is_image=False, max_
         "target_lang": target_lang,
         "is_image": is_image
     }
-    history.insert(0, record)  # 最新的在前面
-    if len(history) > max_count:
-        history = history[:max_count]
-    save_history(history)
-    return history
+    _history.append(record, max_count)
+    return record
@@ -0,0 +1,68 @@
+"""连接预热与保活
+
+启动时和相关配置变化后，在后台线程中对默认文本引擎和图片引擎的源站各发一个 HEAD 请求，
+让第一次翻译直接复用已建立的连接（省去 DNS、TCP、TLS 和代理 CONNECT）。之后每隔
+keepalive_interval 秒检查一次，对空闲超过该时间的源站再发一次 HEAD，赶在服务端关闭
+空闲连接之前保持连接；超过 keepalive_idle_limit 秒没有翻译时暂停保活，不在后台一直发请求。
+"""
+import logging
+import threading
+import time
+
+from translator_engines import CONNECTION_STATS
+
+log = logging.getLogger(__name__)
+
+# 这些配置变化后连接池可能已重建或不再适用，需要重新预热
+WARM_KEYS = {"engine", "image_engine", "engine_backend", "proxy_url", "race_engines", "endpoint_overrides",
+             "ai_endpoint", "deepl_api_key", "google_proxy_mode", "deepl_proxy_mode", "microsoft_proxy_mode",
+             "tencent_proxy_mode", "volcano_proxy_mode", "ai_proxy_mode", "prewarm_connections"}
+
+class ConnectionWarmer:
+    def __init__(self, get_translator, config):
+        """get_translator 返回当前使用的翻译器（配置变化后可能被替换）"""
+        self._get_translator = get_translator
+        self.config = config
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._warmed_at = 0.0  # 最近一次预热的时间，与最近一次翻译一起决定是否继续保活
+
+    def warm(self):
+        """请求立即预热（在后台线程执行）"""
+        if not self.config.get("prewarm_connections", True):
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="connection-warmer", daemon=True)
+            self._thread.start()
+        self._wake.set()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+    def _engines(self):
+        return list(dict.fromkeys([self.config.get("engine", "google"), self.config.get("image_engine", "tencent")]))
+
+    def _run(self):
+        while not self._stopped.is_set():
+            interval = self.config.get("keepalive_interval", 45)
+            woken = self._wake.wait(timeout=interval if interval else None)
+            if self._stopped.is_set() or not self.config.get("prewarm_connections", True):
+                break
+            self._wake.clear()
+            translator = self._get_translator()
+            try:
+                if woken:
+                    start = time.perf_counter()
+                    count = translator.warm_up(self._engines())
+                    self._warmed_at = time.monotonic()
+                    log.debug("预热 %d 个源站，耗时 %.0f ms", count, (time.perf_counter() - start) * 1000)
+                elif time.monotonic() - max(translator.last_request, self._warmed_at) < \
+                        self.config.get("keepalive_idle_limit", 600):
+                    # 只对空闲接近 interval 的源站保活，最近用过的连接本身就是活的
+                    translator.warm_up(self._engines(), min_idle=interval * 0.8)
+                    log.debug("连接复用: %s", CONNECTION_STATS.snapshot())
+            except Exception:
+                log.exception("连接预热失败")
+        self._thread = None
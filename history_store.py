@@ -0,0 +1,419 @@
+"""翻译历史记录存储
+
+HistoryLog：追加写入的 JSONL 文件（默认）。每条记录占一行，最旧的在前。新增记录只在文件
+末尾追加一行；读取最新 N 条时从文件末尾倒着按块读取，不解析更早的记录；文件行数超过保留
+数量的 COMPACT_FACTOR 倍时才把最新的记录写入临时文件并原子替换，摊下来每次追加仍是 O(1)。
+
+HistoryDatabase：SQLite 数据库（history_backend = "sqlite"），适合保留大量记录。时间、引擎、
+目标语言建有索引，原文和译文建有 FTS5 全文索引，搜索和分页查询不必扫描全部记录。
+
+两者接口相同，最新的记录同时保存在内存中，新增记录和打开历史窗口都不必读磁盘；
+写操作在后台线程中合并后批量执行，调用方（GUI 线程）只是把记录放进队列。
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+from itertools import islice
+
+def _parse_line(line):
+    """解析一行记录；写入中断留下的残缺行返回 None"""
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        record = json.loads(line.decode("utf-8"))
+    except ValueError:
+        return None
+    return record if isinstance(record, dict) else None
+
+def _dump_line(record):
+    return (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+def _matches(record, text, engine, target_lang, since, until):
+    """记录是否符合查询条件；text 在原文或译文中出现（不区分大小写），since/until 为时间字符串"""
+    if engine and record.get("engine") != engine:
+        return False
+    if target_lang and record.get("target_lang") != target_lang:
+        return False
+    t = record.get("time", "")
+    if (since and t < since) or (until and t > until):
+        return False
+    if text:
+        text = text.casefold()
+        return text in record.get("source", "").casefold() or text in record.get("result", "").casefold()
+    return True
+
+_FIELDS = ("time", "source", "result", "engine", "target_lang", "is_image")
+
+def _pack(record):
+    """内存中以元组保存记录，比 dict 节省空间"""
+    return tuple(record.get(f, False if f == "is_image" else "") for f in _FIELDS)
+
+def _unpack(item):
+    return dict(zip(_FIELDS, item))
+
+class _QueuedStore:
+    """历史记录存储的公共部分，子类实现 _open/_write/_read/_count。
+
+    最新的 RING_SIZE 条（不超过保留数量）记录以元组保存在内存的环形缓冲中，首次查询时从磁盘
+    读取一次，之后新增记录直接放入缓冲；缓冲包含全部保留的记录时，查询和计数都不读磁盘。
+    写操作排队后由后台线程在 FLUSH_DELAY 秒内合并，批量写入磁盘；flush() 立即写入。
+    """
+    RING_SIZE = 1000
+    FLUSH_DELAY = 2.0
+
+    def __init__(self, max_count):
+        self.max_count = max(1, int(max_count))
+        self._lock = threading.Lock()  # 保护文件/数据库读写
+        self._queue = queue.Queue()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._ring = None  # 最新的记录在左侧；None 表示尚未从磁盘读取
+        self._ring_lock = threading.Lock()
+
+    def set_max_count(self, max_count):
+        """修改保留数量；缓冲在下次查询时按新的数量重新读取"""
+        max_count = max(1, int(max_count))
+        if max_count != self.max_count:
+            with self._ring_lock:
+                self.max_count = max_count
+                self._ring = None
+
+    def append(self, record, max_count=None):
+        """追加一条记录：放入内存缓冲并排队写入磁盘；max_count 为当前的保留数量"""
+        if max_count is not None:
+            self.set_max_count(max_count)
+        with self._ring_lock:
+            if self._ring is not None:
+                self._ring.appendleft(_pack(record))
+        self._submit(("append", record))
+
+    def replace(self, records):
+        """用 records（最新的在前）整体替换历史记录，如清空时传入 []"""
+        records = list(records)
+        with self._ring_lock:
+            if self._ring is not None:
+                self._ring = deque((_pack(r) for r in records[:self._ring.maxlen]), maxlen=self._ring.maxlen)
+        self._submit(("replace", records))
+
+    def tail(self, limit=None):
+        """最新的 limit 条记录（默认为保留数量），最新的在前"""
+        return self.query(limit=self.max_count if limit is None else limit)
+
+    def query(self, text="", engine=None, target_lang=None, since=None, until=None, limit=50, offset=0):
+        """按条件分页查询，最新的在前；内存缓冲不够时先写完排队中的记录再查磁盘"""
+        limit, offset = max(0, int(limit)), max(0, int(offset))
+        filtered = bool(text or engine or target_lang or since or until)
+        with self._ring_lock:
+            ring = self._load_ring()
+            if self._ring_complete(ring):
+                found = (r for r in map(_unpack, ring) if _matches(r, text, engine, target_lang, since, until))
+                return list(islice(found, offset, offset + limit))
+            if not filtered and offset + limit <= len(ring):
+                return [_unpack(r) for r in islice(ring, offset, offset + limit)]
+        self.flush()
+        with self._lock:
+            self._open()
+            return self._read(text, engine, target_lang, since, until, limit, offset)
+
+    def count(self, text="", engine=None, target_lang=None, since=None, until=None):
+        """符合条件的记录数"""
+        with self._ring_lock:
+            ring = self._load_ring()
+            if self._ring_complete(ring):
+                return sum(1 for r in map(_unpack, ring) if _matches(r, text, engine, target_lang, since, until))
+        self.flush()
+        with self._lock:
+            self._open()
+            return self._count(text, engine, target_lang, since, until)
+
+    def flush(self):
+        """立即写入排队中的记录并等待完成，退出程序前调用"""
+        if self._thread is not None:
+            self._queue.put(("flush", None))
+            self._queue.join()
+
+    def _load_ring(self):
+        """调用方持有 _ring_lock；首次调用时从磁盘读取最新的记录"""
+        if self._ring is None:
+            size = min(self.max_count, self.RING_SIZE)
+            self.flush()
+            with self._lock:
+                self._open()
+                records = self._read("", None, None, None, None, size, 0)
+            self._ring = deque(map(_pack, records), maxlen=size)
+        return self._ring
+
+    def _ring_complete(self, ring):
+        """缓冲是否包含全部保留的记录：保留数量不超过缓冲大小，或缓冲还没有写满"""
+        return self.max_count <= ring.maxlen or len(ring) < ring.maxlen
+
+    def _submit(self, item):
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+                self._thread.start()
+        self._queue.put(item)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.FLUSH_DELAY
+            # 等待 FLUSH_DELAY 秒收集更多写操作，收到 flush 时立即写入
+            while batch[-1][0] != "flush":
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with self._lock:
+                    self._open()
+                    for op, arg in batch:
+                        if op != "flush":
+                            self._write(op, arg)
+                    self._commit()
+            except (OSError, sqlite3.Error):
+                pass  # 历史记录写入失败不影响翻译
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _commit(self):
+        pass
+
+class HistoryLog(_QueuedStore):
+    # 保留数量不超过内存缓冲大小时，搜索和计数都不读文件；更大的保留数量由 configure_history 改用 SQLite
+    MAX_COUNT = _QueuedStore.RING_SIZE
+    COMPACT_FACTOR = 2
+    READ_BLOCK = 64 * 1024
+
+    def __init__(self, path, max_count=10, legacy_path=None):
+        """legacy_path 为旧版的 JSON 数组文件（最新的在前），首次读写时导入并改名为 .bak"""
+        super().__init__(max_count)
+        self.path = path
+        self.legacy_path = legacy_path
+        self._lines = None  # 文件当前行数，首次写入时统计
+        self._partial = False  # 文件末尾是否有未写完的一行
+        self._pending = []  # 本批次待追加的记录
+
+    def _write(self, op, arg):
+        if op == "append":
+            self._pending.append(arg)
+        else:
+            self._pending = []  # 整体替换前的追加没有意义
+            self._rewrite(arg)
+
+    def _commit(self):
+        if self._pending:
+            records, self._pending = self._pending, []
+            self._append(records)
+
+    def _read(self, text, engine, target_lang, since, until, limit, offset):
+        if not (text or engine or target_lang or since or until):
+            return self._read_tail(offset + limit)[offset:]
+        # 文件只保留 max_count 的两倍以内，带条件时在保留范围内逐条过滤
+        found = [r for r in self._read_tail(self.max_count) if _matches(r, text, engine, target_lang, since, until)]
+        return found[offset:offset + limit]
+
+    def _count(self, text, engine, target_lang, since, until):
+        if not (text or engine or target_lang or since or until):
+            if self._lines is None:
+                self._lines = self._count_lines()
+            return min(self._lines, self.max_count)  # 不带条件时只数行数，不解析记录
+        return len([r for r in self._read_tail(self.max_count) if _matches(r, text, engine, target_lang, since, until)])
+
+    def _append(self, records):
+        """一次写入追加若干行，records 最旧的在前"""
+        if self._lines is None:
+            self._lines = self._count_lines()
+        data = b"".join(map(_dump_line, records))
+        if self._partial:
+            data = b"\n" + data  # 上次写入中断留下的残缺行单独成行，解析时跳过
+        with open(self.path, "ab") as f:
+            f.write(data)
+        self._partial = False
+        self._lines += len(records)
+        if self._lines > self.max_count * self.COMPACT_FACTOR:
+            self._rewrite(self._read_tail(self.max_count))
+
+    def _rewrite(self, records):
+        """写入临时文件后原子替换；records 最新的在前"""
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            for record in reversed(records):
+                f.write(_dump_line(record))
+        os.replace(tmp, self.path)
+        self._lines = len(records)
+
+    def _count_lines(self):
+        """统计行数，并记录文件是否以不完整的一行结尾"""
+        lines, last = 0, b"\n"
+        try:
+            with open(self.path, "rb") as f:
+                for chunk in iter(lambda: f.read(self.READ_BLOCK), b""):
+                    lines += chunk.count(b"\n")
+                    last = chunk[-1:]
+        except OSError:
+            pass
+        self._partial = last != b"\n"
+        return lines
+
+    def _read_tail(self, limit):
+        """从文件末尾倒着读取最新的 limit 条记录，最新的在前"""
+        records = []
+        if limit == 0:
+            return records
+        try:
+            f = open(self.path, "rb")
+        except OSError:
+            return records
+        with f:
+            pos = f.seek(0, os.SEEK_END)
+            rest = b""  # 当前块开头尚不完整的一行
+            while pos > 0 and len(records) < limit:
+                step = min(self.READ_BLOCK, pos)
+                pos -= step
+                f.seek(pos)
+                lines = (f.read(step) + rest).split(b"\n")
+                rest = lines.pop(0)
+                for line in reversed(lines):
+                    record = _parse_line(line)
+                    if record is not None:
+                        records.append(record)
+            if pos == 0 and len(records) < limit:
+                record = _parse_line(rest)
+                if record is not None:
+                    records.append(record)
+        return records[:limit]
+
+    def _open(self):
+        """导入旧版 history.json（只在 JSONL 文件还不存在时进行一次）"""
+        legacy, self.legacy_path = self.legacy_path, None
+        if not legacy or not os.path.exists(legacy) or os.path.exists(self.path):
+            return
+        try:
+            with open(legacy, "r", encoding="utf-8") as f:
+                records = json.load(f)
+        except (OSError, ValueError):
+            return
+        if isinstance(records, list):
+            self._rewrite([r for r in records if isinstance(r, dict)])
+            os.replace(legacy, legacy + ".bak")
+
+class HistoryDatabase(_QueuedStore):
+    PRUNE_INTERVAL = 64  # 每写入多少条检查一次是否超过保留数量
+
+    def __init__(self, path, max_count=10, import_path=None):
+        """import_path 为 JSONL 历史文件，数据库为空时导入其中的记录"""
+        super().__init__(max_count)
+        self.path = path
+        self.import_path = import_path
+        self._db = None
+        self._fts = False  # 是否可用 FTS5 全文索引
+        self._trigram = False  # 是否使用 trigram 分词（可匹配中文等不以空格分词的文字）
+        self._writes = 0
+
+    def _open(self):
+        if self._db is not None:
+            return
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.execute("CREATE TABLE IF NOT EXISTS history ("
+                   "id INTEGER PRIMARY KEY AUTOINCREMENT, time TEXT NOT NULL, source TEXT NOT NULL, "
+                   "result TEXT NOT NULL, engine TEXT NOT NULL, target_lang TEXT NOT NULL, is_image INTEGER NOT NULL)")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_history_time ON history(time)")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_history_engine ON history(engine, id)")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_history_lang ON history(target_lang, id)")
+        self._db = db
+        self._create_fts()
+        db.commit()
+        if self.import_path and db.execute("SELECT 1 FROM history LIMIT 1").fetchone() is None:
+            self._import(self.import_path)
+        self.import_path = None
+
+    def _create_fts(self):
+        """建立外部内容的 FTS5 索引并用触发器保持同步；SQLite 不支持 FTS5 时退回 LIKE 查询"""
+        for tokenize in ("trigram", "unicode61"):
+            try:
+                self._db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5("
+                                 f"source, result, content='history', content_rowid='id', tokenize='{tokenize}')")
+            except sqlite3.OperationalError:
+                continue
+            self._fts = True
+            row = self._db.execute("SELECT sql FROM sqlite_master WHERE name = 'history_fts'").fetchone()
+            self._trigram = "trigram" in row[0]
+            break
+        if not self._fts:
+            return
+        self._db.executescript("""
+            CREATE TRIGGER IF NOT EXISTS history_ai AFTER INSERT ON history BEGIN
+                INSERT INTO history_fts(rowid, source, result) VALUES (new.id, new.source, new.result);
+            END;
+            CREATE TRIGGER IF NOT EXISTS history_ad AFTER DELETE ON history BEGIN
+                INSERT INTO history_fts(history_fts, rowid, source, result) VALUES ('delete', old.id, old.source, old.result);
+            END;
+        """)
+
+    def _import(self, path):
+        log = HistoryLog(path, max_count=self.max_count)
+        records = log._read_tail(self.max_count)
+        self._insert(reversed(records))
+        self._db.commit()
+
+    def _insert(self, records):
+        self._db.executemany("INSERT INTO history (time, source, result, engine, target_lang, is_image) "
+                             "VALUES (?, ?, ?, ?, ?, ?)",
+                             [(r.get("time", ""), r.get("source", ""), r.get("result", ""), r.get("engine", ""),
+                               r.get("target_lang", ""), int(bool(r.get("is_image", False)))) for r in records])
+
+    def _write(self, op, arg):
+        if op == "append":
+            self._insert([arg])
+            self._writes += 1
+            if self._writes % self.PRUNE_INTERVAL == 0:
+                self._prune()
+        else:
+            self._db.execute("DELETE FROM history")
+            self._insert(reversed(arg))
+
+    def _commit(self):
+        self._db.commit()
+
+    def _prune(self):
+        """删除超过保留数量的旧记录（索引随触发器一起删除）"""
+        row = self._db.execute("SELECT id FROM history ORDER BY id DESC LIMIT 1 OFFSET ?", (self.max_count,)).fetchone()
+        if row is not None:
+            self._db.execute("DELETE FROM history WHERE id <= ?", (row[0],))
+
+    def _where(self, text, engine, target_lang, since, until):
+        clauses, args = [], []
+        if text:
+            if self._fts and (not self._trigram or len(text) >= 3):
+                # 整体作为一个短语匹配，避免用户输入被当作 FTS 查询语法
+                clauses.append("id IN (SELECT rowid FROM history_fts WHERE history_fts MATCH ?)")
+                args.append('"' + text.replace('"', '""') + '"')
+            else:  # trigram 分词无法匹配少于 3 个字符的查询
+                pattern = "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                clauses.append("(source LIKE ? ESCAPE '\\' OR result LIKE ? ESCAPE '\\')")
+                args += [pattern, pattern]
+        for column, op, value in (("engine", "=", engine), ("target_lang", "=", target_lang),
+                                  ("time", ">=", since), ("time", "<=", until)):
+            if value:
+                clauses.append(f"{column} {op} ?")
+                args.append(value)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), args
+
+    def _read(self, text, engine, target_lang, since, until, limit, offset):
+        where, args = self._where(text, engine, target_lang, since, until)
+        rows = self._db.execute("SELECT time, source, result, engine, target_lang, is_image FROM history"
+                                f"{where} ORDER BY id DESC LIMIT ? OFFSET ?", args + [limit, offset]).fetchall()
+        return [{"time": t, "source": src, "result": res, "engine": eng, "target_lang": lang, "is_image": bool(img)}
+                for t, src, res, eng, lang, img in rows]
+
+    def _count(self, text, engine, target_lang, since, until):
+        where, args = self._where(text, engine, target_lang, since, until)
+        return self._db.execute(f"SELECT COUNT(*) FROM history{where}", args).fetchone()[0]
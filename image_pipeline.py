@@ -0,0 +1,462 @@
+"""截图上传前的预处理：裁掉纯色边框、缩小到引擎可用的最大分辨率、按需转灰度，
+再在引擎支持的格式中选体积最小的编码；处理后不比原图小时原样上传。
+
+各引擎的参数在配置 image_preprocess 中：
+    enabled        是否预处理
+    max_side       长边上限（像素）
+    max_short_side 短边上限（像素），0 表示不限
+    crop_borders   裁掉四周与左上角颜色相同的纯色边框
+    grayscale      转为灰度（文字识别通常不需要颜色）
+    formats        可选编码格式，png / jpeg / webp
+    quality        jpeg / webp 的质量
+    min_bytes      小于该字节数且分辨率未超限的图片直接上传，省去重新编码的耗时
+
+未安装 Pillow 时图片原样上传，图片缓存只做精确匹配，长截图不分块（只翻译文本的命令行工具不需要 Pillow）。
+"""
+import hashlib
+import io
+import json
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    from PIL import Image, ImageChops
+except ImportError:  # 未安装 Pillow 时不做预处理、近似匹配和分块
+    Image = ImageChops = None
+
+from translation_cache import make_key
+
+DEFAULT_SETTINGS = {
+    "enabled": True,
+    "max_side": 2048,
+    "max_short_side": 0,
+    "crop_borders": True,
+    "grayscale": False,
+    "formats": ["png", "jpeg"],
+    "quality": 90,
+    "min_bytes": 256 * 1024,
+}
+
+# 引擎 -> 默认参数；腾讯图片翻译只接受 PNG/JPG，OpenAI 视觉模型会把图片缩放到 2048 以内、短边 768
+ENGINE_DEFAULTS = {
+    "tencent": {"max_side": 4000, "grayscale": True, "formats": ["png", "jpeg"]},
+    "ai": {"max_side": 2048, "max_short_side": 768, "formats": ["png", "jpeg"]},
+}
+
+BORDER_TOLERANCE = 8  # 与背景色的差值不超过该值视为边框
+BORDER_PADDING = 4    # 裁剪后保留的边距（像素）
+
+DHASH_SIZE = 16        # 感知哈希网格边长，共 DHASH_SIZE² 位
+THUMB_SIZE = 512       # 近似匹配时逐像素比较的缩略图长边
+NEAR_DIFF_BOX = 24     # 近似截图的差异须集中在这么大（原图像素）的区域内，如鼠标指针、输入光标
+NEAR_DIFF_LEVEL = 12   # 缩略图灰度差超过该值的像素视为不同
+
+_MIME_TYPES = {b"\x89PNG": "image/png", b"\xff\xd8\xff": "image/jpeg", b"RIFF": "image/webp"}
+
+class EncodedImage:
+    """编码一次、多次复用的图片：编码后的字节 + SHA-256 + 尺寸。
+
+    首次翻译和之后切换引擎/语言的重翻共用同一份编码结果，按预处理参数缓存预处理后的字节；
+    sha256 按内容寻址，可直接作为图片缓存键。
+    """
+
+    def __init__(self, data, width=0, height=0):
+        self.data = data
+        self.width = width
+        self.height = height
+        self.sha256 = hashlib.sha256(data).hexdigest()
+        self._prepared = {}  # 预处理参数 -> (字节, 说明)
+        self._fingerprint = False  # 尚未计算
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def fingerprint(self):
+        """ImageFingerprint，首次访问时计算；无法解码时为 None"""
+        with self._lock:
+            if self._fingerprint is False:
+                self._fingerprint = ImageFingerprint.from_bytes(self.data)
+            return self._fingerprint
+
+    def prepared(self, settings):
+        """按 settings 预处理，同样的参数只处理一次"""
+        key = json.dumps(settings, sort_keys=True)
+        with self._lock:
+            if key not in self._prepared:
+                self._prepared[key] = preprocess_image(self.data, settings)
+            return self._prepared[key]
+
+    def tiles(self, tile_height, overlap, settings):
+        """按 split_tiles 切分，同样的参数只切分一次"""
+        key = json.dumps(["tiles", tile_height, overlap, settings], sort_keys=True)
+        with self._lock:
+            if key not in self._prepared:
+                self._prepared[key] = split_tiles(self.data, tile_height, overlap, settings)
+            return self._prepared[key]
+
+def as_encoded_image(image):
+    """图片字节包装为 EncodedImage，已是 EncodedImage 时原样返回"""
+    return image if isinstance(image, EncodedImage) else EncodedImage(image)
+
+class ImageFingerprint:
+    """用于近似匹配的图片特征：原图尺寸、dHash 感知哈希和灰度缩略图"""
+
+    def __init__(self, size, phash, thumb):
+        self.size = size
+        self.phash = phash
+        self.thumb = thumb
+
+    @classmethod
+    def from_bytes(cls, data):
+        """解码图片并计算特征，无法解码时返回 None。
+        缩放和比较都由 Pillow 整图完成，不逐像素循环。"""
+        if Image is None:
+            return None
+        try:
+            img = Image.open(io.BytesIO(data))
+            size = img.size
+            img.draft("L", (THUMB_SIZE, THUMB_SIZE))  # JPEG 可直接按缩小后的尺寸解码
+            thumb = img.convert("L")
+            thumb.thumbnail((THUMB_SIZE, THUMB_SIZE), Image.BILINEAR, reducing_gap=2.0)
+        except Exception:
+            return None
+        # dHash：缩小为 (N+1)×N，逐行比较相邻像素的明暗，得到 N² 位整数
+        small = thumb.resize((DHASH_SIZE + 1, DHASH_SIZE), Image.BILINEAR)
+        left = small.crop((0, 0, DHASH_SIZE, DHASH_SIZE))
+        right = small.crop((1, 0, DHASH_SIZE + 1, DHASH_SIZE))
+        bits = ImageChops.subtract(left, right).point(lambda p: 255 if p else 0).convert("1")
+        return cls(size, int.from_bytes(bits.tobytes(), "big"), thumb)
+
+    def distance(self, other):
+        """感知哈希的汉明距离"""
+        return bin(self.phash ^ other.phash).count("1")
+
+    def near_duplicate(self, other):
+        """尺寸相同，且缩略图中所有明显不同的像素都集中在 NEAR_DIFF_BOX 见方的区域内。
+
+        文档截图缩小后的感知哈希几乎只反映版面，改动几个字时哈希可能完全相同，
+        因此哈希只用来挑选候选，最终以缩略图的逐像素差异为准。"""
+        if self.size != other.size or self.thumb.size != other.thumb.size:
+            return False
+        diff = ImageChops.difference(self.thumb, other.thumb)
+        box = diff.point(lambda p: 255 if p > NEAR_DIFF_LEVEL else 0).getbbox()
+        if box is None:
+            return True
+        scale = self.size[0] / self.thumb.size[0]
+        return (box[2] - box[0]) * scale <= NEAR_DIFF_BOX and (box[3] - box[1]) * scale <= NEAR_DIFF_BOX
+
+class ImageCache:
+    """图片翻译结果缓存，结果存放在 TranslationCache 中。
+
+    先按图片内容的 SHA-256 精确查找；未命中时在最近的图片中找感知哈希汉明距离不超过
+    max_distance、且只差一个光标或几个像素的近似截图，复用其结果。max_distance 为 0 时只做精确匹配。
+    """
+
+    RECENT_SIZE = 64  # 参与近似匹配的最近图片数
+
+    def __init__(self, cache, max_distance=4):
+        self.cache = cache
+        self.max_distance = max(0, int(max_distance))
+        self._recent = OrderedDict()  # 缓存键 -> (scope, ImageFingerprint)
+        self._layouts = OrderedDict()  # (图片 SHA-256, 引擎) -> 最近一次的 ImageRecord 列表
+        self._lock = threading.Lock()
+        self.near_hits = 0
+
+    def get(self, image, scope):
+        """image 为 EncodedImage，scope 为引擎、目标语言等区分结果的字段"""
+        result = self.cache.get(make_key("image", image.sha256, *scope))
+        if result is not None or self.max_distance == 0:
+            return load_image_result(result) if result is not None else None
+        fingerprint = image.fingerprint
+        if fingerprint is None:
+            return None
+        with self._lock:
+            candidates = [(fingerprint.distance(fp), key, fp) for key, (s, fp) in self._recent.items() if s == scope]
+        for distance, key, fp in sorted(candidates, key=lambda c: c[0]):
+            if distance > self.max_distance:
+                break
+            if not fingerprint.near_duplicate(fp):
+                continue
+            result = self.cache.get(key)
+            if result is not None:
+                result = load_image_result(result)
+                self.near_hits += 1
+                self.put(image, scope, result)  # 之后同一张图直接精确命中
+                return result
+        return None
+
+    def layout(self, image, engine):
+        """同一张图片最近一次由 engine 识别出的文字区域（任意目标语言），没有时返回 None"""
+        with self._lock:
+            return self._layouts.get((image.sha256, engine))
+
+    def put(self, image, scope, result):
+        key = make_key("image", image.sha256, *scope)
+        if isinstance(result, ImageTranslation):
+            self.cache.put(key, result.to_json())
+            with self._lock:
+                self._layouts[(image.sha256, scope[0])] = result.records
+                self._layouts.move_to_end((image.sha256, scope[0]))
+                while len(self._layouts) > self.RECENT_SIZE:
+                    self._layouts.popitem(last=False)
+        else:
+            self.cache.put(key, result)
+        fingerprint = image.fingerprint if self.max_distance else None
+        if fingerprint is None:
+            return
+        with self._lock:
+            self._recent[key] = (scope, fingerprint)
+            self._recent.move_to_end(key)
+            while len(self._recent) > self.RECENT_SIZE:
+                self._recent.popitem(last=False)
+
+def image_mime(data):
+    """根据文件头判断图片的 MIME 类型，无法识别时按 PNG 处理"""
+    head = bytes(data[:4])
+    for magic, mime in _MIME_TYPES.items():
+        if head.startswith(magic):
+            return mime
+    return "image/png"
+
+def engine_settings(config, engine):
+    """合并默认参数、引擎默认参数和配置中的 image_preprocess[engine]"""
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(ENGINE_DEFAULTS.get(engine, {}))
+    settings.update((config.get("image_preprocess") or {}).get(engine, {}))
+    return settings
+
+def _crop_borders(img):
+    """返回 (裁剪后的图片, 裁剪区域左上角在原图中的坐标)"""
+    background = Image.new(img.mode, img.size, img.getpixel((0, 0)))
+    diff = ImageChops.difference(img, background).convert("L")
+    box = diff.point(lambda p: 255 if p > BORDER_TOLERANCE else 0).getbbox()
+    if box is None or box == (0, 0) + img.size:
+        return img, (0, 0)
+    left, top, right, bottom = box
+    w, h = img.size
+    left, top = max(0, left - BORDER_PADDING), max(0, top - BORDER_PADDING)
+    return img.crop((left, top, min(w, right + BORDER_PADDING), min(h, bottom + BORDER_PADDING))), (left, top)
+
+def _scale(size, settings):
+    w, h = size
+    scale = 1.0
+    if settings["max_side"]:
+        scale = min(scale, settings["max_side"] / max(w, h))
+    if settings["max_short_side"]:
+        scale = min(scale, settings["max_short_side"] / min(w, h))
+    return scale
+
+def _encode(img, fmt, quality):
+    # 压缩参数偏向速度：optimize / 高 method 只多省几个百分点，却要多花数倍时间
+    out = io.BytesIO()
+    if fmt == "png":
+        img.save(out, "PNG", compress_level=6)
+    elif fmt == "jpeg":
+        img.save(out, "JPEG", quality=quality, subsampling=0 if quality >= 90 else 2)
+    elif fmt == "webp":
+        img.save(out, "WEBP", quality=quality, method=2)
+    else:
+        return None
+    return out.getvalue()
+
+def _fit_and_encode(img, settings):
+    """缩放、按需转灰度，并用 settings 中体积最小的格式编码；返回 (字节, 格式, 处理后的图片)"""
+    scale = _scale(img.size, settings)
+    if scale < 1:
+        size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+        img = img.resize(size, Image.LANCZOS, reducing_gap=3.0)  # 先整数倍缩小再 LANCZOS，速度快数倍
+    if settings["grayscale"] and img.mode != "L":
+        img = img.convert("L")
+    best, best_fmt = None, None
+    for fmt in settings["formats"]:
+        data = _encode(img, fmt, settings["quality"])
+        if data is not None and (best is None or len(data) < len(best)):
+            best, best_fmt = data, fmt
+    return best, best_fmt, img
+
+def preprocess_image(image_bytes, settings):
+    """按 settings 处理图片，返回 (图片字节, 说明 dict)；未处理时返回原图和 None"""
+    if not settings.get("enabled", True) or Image is None:
+        return image_bytes, None
+    start = time.perf_counter()
+    try:
+        img = Image.open(io.BytesIO(image_bytes))  # 只读取文件头，尚未解码
+        if len(image_bytes) < settings["min_bytes"] and _scale(img.size, settings) >= 1:
+            return image_bytes, None
+        img.load()
+    except Exception:
+        return image_bytes, None
+    original_size = img.size
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")  # 截图的透明通道对识别没有意义，JPEG 也不支持
+    offset = (0, 0)
+    if settings["crop_borders"]:
+        img, offset = _crop_borders(img)
+    cropped_width = img.width
+    best, best_fmt, img = _fit_and_encode(img, settings)
+    if best is None or len(best) >= len(image_bytes):
+        return image_bytes, None
+    info = {
+        "bytes_before": len(image_bytes),
+        "bytes_after": len(best),
+        "size_before": original_size,
+        "size_after": img.size,
+        "format": best_fmt,
+        "seconds": time.perf_counter() - start,
+        "offset": offset,                      # 上传图片的坐标 × scale + offset = 原图坐标
+        "scale": cropped_width / img.width,
+    }
+    return best, info
+
+class ImageRecord:
+    """图片中的一个文字区域：原文、译文、在原图中的位置 (x, y, w, h) 和识别置信度（可能为 None）"""
+
+    def __init__(self, source, target, box, confidence=None):
+        self.source = source
+        self.target = target
+        self.box = box
+        self.confidence = confidence
+
+    @classmethod
+    def from_tencent(cls, item):
+        """由腾讯云 ImageRecord.Value 中的一项构造，坐标为上传图片中的像素"""
+        box = (item.get("X", 0), item.get("Y", 0), item.get("W", 0), item.get("H", 0))
+        return cls(item.get("SourceText", ""), item.get("TargetText", ""), box, item.get("Confidence"))
+
+    def mapped(self, scale, offset=(0, 0)):
+        """坐标乘以 scale 再平移 offset，用于把上传图片（缩放/裁边/分块后）的坐标换算回原图"""
+        x, y, w, h = self.box
+        box = (offset[0] + x * scale, offset[1] + y * scale, w * scale, h * scale)
+        return ImageRecord(self.source, self.target, tuple(round(v) for v in box), self.confidence)
+
+    def to_dict(self):
+        return {"source": self.source, "target": self.target, "box": list(self.box), "confidence": self.confidence}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d["source"], d["target"], tuple(d["box"]), d.get("confidence"))
+
+class ImageTranslation(str):
+    """带版面信息的图片翻译结果：仍是按行拼接的译文 str，records 为各文字区域的 ImageRecord，
+    可用于在弹窗中叠加显示，或在切换目标语言时只重翻各区域的文字"""
+
+    def __new__(cls, records):
+        text = super().__new__(cls, "\n".join(r.target for r in records))
+        text.records = records
+        return text
+
+    def mapped(self, scale, offset=(0, 0)):
+        return ImageTranslation([r.mapped(scale, offset) for r in self.records])
+
+    def retargeted(self, targets):
+        """版面不变、替换各区域译文后的结果，targets 与 records 一一对应"""
+        return ImageTranslation([ImageRecord(r.source, target, r.box, r.confidence)
+                                 for r, target in zip(self.records, targets)])
+
+    def to_json(self):
+        return json.dumps({"records": [r.to_dict() for r in self.records]}, ensure_ascii=False)
+
+def load_image_result(value):
+    """还原 ImageCache 中保存的结果：结构化结果为 JSON，纯文本结果原样返回"""
+    if value.startswith('{"records"'):
+        try:
+            return ImageTranslation([ImageRecord.from_dict(d) for d in json.loads(value)["records"]])
+        except (ValueError, KeyError, TypeError):
+            pass
+    return value
+
+class ImageTile:
+    """长截图切出的一条横条。top/bottom 为在原图中的范围；
+    keep_top/keep_bottom 为该条负责的范围：中心落在其中的文字行归这一条，重叠区里的行不会重复；
+    scale 为原图像素与上传图片像素之比，用于把识别坐标换算回原图。"""
+
+    def __init__(self, data, top, bottom, keep_top, keep_bottom, scale):
+        self.data = data
+        self.top = top
+        self.bottom = bottom
+        self.keep_top = keep_top
+        self.keep_bottom = keep_bottom
+        self.scale = scale
+
+    def owns(self, y, height):
+        """上传图片坐标系中的一行（y 为上边、height 为行高）是否归这一条"""
+        center = self.top + (y + height / 2) * self.scale
+        return self.keep_top <= center < self.keep_bottom
+
+def split_tiles(image_bytes, tile_height, overlap, settings):
+    """把高度超过 tile_height + overlap 的长截图切成相互重叠 overlap 像素的横条，
+    每条按 settings 缩放编码（不裁边框，以免坐标偏移）；不需要切分时返回 None。
+    overlap 应大于一行文字的高度，保证每行至少完整出现在一条中。"""
+    if Image is None:
+        return None
+    try:
+        img = Image.open(io.BytesIO(image_bytes))
+        if img.height <= tile_height + overlap:
+            return None
+        img.load()
+    except Exception:
+        return None
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    ranges, top = [], 0
+    while True:
+        bottom = min(top + tile_height, img.height)
+        ranges.append((top, bottom))
+        if bottom == img.height:
+            break
+        top = bottom - overlap
+    tiles = []
+    for i, (top, bottom) in enumerate(ranges):
+        # 重叠区以中线为界分给上下两条
+        keep_top = (top + ranges[i - 1][1]) / 2 if i else 0
+        keep_bottom = (ranges[i + 1][0] + bottom) / 2 if i + 1 < len(ranges) else img.height + 1
+        data, _, encoded = _fit_and_encode(img.crop((0, top, img.width, bottom)), settings)
+        tiles.append(ImageTile(data, top, bottom, keep_top, keep_bottom, (bottom - top) / encoded.height))
+    return tiles
+
+class PreprocessStats:
+    """图片预处理统计：节省的字节数，以及预处理耗时与请求耗时，便于比较是否划算（benchmark 输出）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.images = 0
+            self.bytes_before = self.bytes_after = 0
+            self.preprocess_seconds = self.request_seconds = 0.0
+
+    def record(self, info, request_seconds):
+        """info 为 preprocess_image 返回的说明，request_seconds 为上传处理后图片的请求耗时"""
+        with self._lock:
+            self.images += 1
+            self.bytes_before += info["bytes_before"]
+            self.bytes_after += info["bytes_after"]
+            self.preprocess_seconds += info["seconds"]
+            self.request_seconds += request_seconds
+
+    def snapshot(self):
+        """返回 {"images", "bytes_before", "bytes_after", "saved_ratio", "preprocess_ms", "request_ms"}，
+        耗时为每张图片的平均值"""
+        with self._lock:
+            n = self.images
+            return {
+                "images": n,
+                "bytes_before": self.bytes_before,
+                "bytes_after": self.bytes_after,
+                "saved_ratio": 1 - self.bytes_after / self.bytes_before if self.bytes_before else 0.0,
+                "preprocess_ms": self.preprocess_seconds * 1000 / n if n else 0.0,
+                "request_ms": self.request_seconds * 1000 / n if n else 0.0,
+            }
+
+PREPROCESS_STATS = PreprocessStats()
+
+def describe(info):
+    """预处理结果的简短说明，如 "图片 3.1 MB → 420 KB" """
+    def fmt(n):
+        return f"{n / 1048576:.1f} MB" if n >= 1048576 else f"{n / 1024:.0f} KB"
+    return f"图片 {fmt(info['bytes_before'])} → {fmt(info['bytes_after'])}"
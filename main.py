@@ -1,17 +1,25 @@
 import sys
 import time
-import threading
 import ctypes
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import pyperclip
 import winreg
 from pynput import mouse, keyboard
 from PyQt5.QtWidgets import QApplication, QSystemTrayIcon, QMenu, QAction, QStyle, QMessageBox
-from PyQt5.QtCore import QPoint, pyqtSignal as Signal, QObject, QTimer, Qt, QBuffer, QIODevice
-from PyQt5.QtGui import QIcon, QPixmap
+from PyQt5.QtCore import QPoint, pyqtSignal as Signal, QObject, QTimer, Qt, QBuffer, QIODevice, QByteArray
+from PyQt5.QtGui import QIcon
 from PyQt5.QtNetwork import QLocalServer, QLocalSocket
 
-from config_manager import load_config, save_config, add_history_record, load_history
-from translator_engines import Translator
+from config_manager import ConfigStore, add_history_record, flush_history, configure_history
+from translator_engines import ErrorText, is_error, MULTI_ENGINE_MODES
+from image_pipeline import EncodedImage, describe as describe_image
+from async_translator import create_translator
+from translation_cache import open_cache
+from request_scheduler import RequestScheduler
+from translation_server import start_server
+from connection_warmer import ConnectionWarmer, WARM_KEYS
+from speculation import SpeculationBudget
 from ui_components import FloatingIcon, ResultPopup, SettingsWindow, HistoryWindow
 
 class SignalBridge(QObject):
@@ -20,6 +28,30 @@ class SignalBridge(QObject):
     hide_icon = Signal()  # 隐藏图标信号
     request_direct_translate = Signal(int, int)  # 划词后ALT直接翻译信号
 
+def _encode_image(image):
+    """把 QImage 编码为 PNG 并包装为 EncodedImage；PNG 直接写入 QByteArray，只在最后复制一次为 bytes。
+    QImage（不同于 QPixmap）可以在非 GUI 线程中使用。"""
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.WriteOnly)
+    image.save(buffer, "PNG")
+    buffer.close()
+    return EncodedImage(data.data(), image.width(), image.height())
+
+def _format_timing(timing):
+    """把 translate_stream 记录的耗时格式化为状态栏文字"""
+    def fmt(sec):
+        return f"{sec * 1000:.0f} ms" if sec < 1 else f"{sec:.2f} s"
+    total = timing.get("total", 0)
+    ttft = timing.get("ttft", total)
+    if total - ttft > 0.05:
+        text = f"首字 {fmt(ttft)} · 总计 {fmt(total)}"
+    else:
+        text = f"耗时 {fmt(total)}"
+    if "image" in timing:
+        text += " · " + describe_image(timing["image"])
+    return text
+
 class GlobalListener:
     def __init__(self, bridge, controller):
         self.bridge = bridge
@@ -93,13 +125,27 @@ class GlobalListener:
         self.kb_listener.start()
 
 class AppController(QObject):
-    translation_finished = Signal(str, QPoint)
+    translation_finished = Signal(object, QPoint)  # object：保留 ErrorText 类型，show_result 据此区分失败结果
     retranslation_finished = Signal(str)  # 重翻完成信号
+    stream_delta = Signal(str, bool)      # 流式增量 (text, 是否为首段)
+    status_changed = Signal(str)          # 弹窗状态栏文字（耗时）
 
     def __init__(self):
         super().__init__()
-        self.config = load_config()
-        self.translator = Translator(self.config)
+        self.config_store = ConfigStore()
+        self.config = self.config_store.data  # 与 translator 共享同一个 dict，修改后实时生效
+        self.config_store.subscribe(self.on_config_changed)
+        self.cache = open_cache(self.config)  # 翻译缓存跨 Translator 重建保留
+        configure_history(self.config)
+        self.translator = create_translator(self.config, cache=self.cache)
+        self.scheduler = RequestScheduler(max_workers=3)  # 翻译请求线程池
+        self.server = None  # 本地 HTTP 翻译服务
+        self.apply_server_config()
+        self.warmer = ConnectionWarmer(lambda: self.translator, self.config)
+        self.warmer.warm()
+        self.budget = SpeculationBudget(self.config)
+        self.speculation = None  # 进行中的推测翻译：((原文, 目标语言, 引擎), ticket, 完成事件)
+        self.prefetch = None  # 进行中的预取：(原文或图片, {(目标语言, 引擎): 完成事件}, ticket)
         
         self.icon = FloatingIcon(self.config.get('custom_icon_path', ''))
         self.popup = ResultPopup()
@@ -112,6 +158,8 @@ class AppController(QObject):
         # 连接重翻信号
         self.popup.retranslate_requested.connect(self.do_retranslation)
         self.retranslation_finished.connect(self.popup.update_result)
+        self.stream_delta.connect(self.on_stream_delta)
+        self.status_changed.connect(self.popup.set_status)
         
         # 连接历史记录信号
         self.popup.show_history_requested.connect(self.show_history)
@@ -119,7 +167,7 @@ class AppController(QObject):
         self.bridge = SignalBridge()
         self.bridge.request_icon.connect(self.on_request_icon)
         self.bridge.request_image_icon.connect(self.on_image_detected)
-        self.bridge.hide_icon.connect(self.hide_icon)  # 连接隐藏图标信号
+        self.bridge.hide_icon.connect(self.dismiss_icon)  # 点击其它位置关闭图标
         self.bridge.request_direct_translate.connect(self.on_request_direct_translate)  # 直接翻译
         
         self.listener = GlobalListener(self.bridge, self)
@@ -127,9 +175,9 @@ class AppController(QObject):
         
         self.icon.clicked.connect(self.do_translation)
         self.current_text = ""
-        self.current_image = None  # 保存当前图片
+        self.current_image = None  # 当前图片：编码为 EncodedImage 的 Future
+        self.image_encoder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="encode")
         self.last_pos = QPoint(0,0)
-        self._translate_id = 0  # 翻译请求ID，用于取消过期的翻译响应
         self.icon_hide_timer = None  # 图标自动隐藏定时器
         
         # 启动剪贴板监控
@@ -139,11 +187,49 @@ class AppController(QObject):
         self.last_clipboard_seq = 0  # 剪贴板序列号（Windows API）
 
     def update_config(self, new_config):
-        self.config.update(new_config)
-        save_config(self.config)
-        self.translator = Translator(self.config)
-        self.icon.update_icon(self.config.get('custom_icon_path', ''))
-        self.handle_auto_start(self.config.get('auto_start', False))
+        self.config_store.update(new_config)
+
+    def on_config_changed(self, changed):
+        """只重建受配置变化影响的部分，已建立的连接池尽量保留"""
+        if "engine_backend" in changed:
+            old_translator = self.translator
+            self.translator = create_translator(self.config, cache=self.cache)
+            old_translator.close()
+        else:
+            self.translator.config_changed(changed)
+        if changed & WARM_KEYS:
+            self.warmer.warm()
+        if changed & {"server_enabled", "server_port"}:
+            self.apply_server_config()
+        if changed & {"history_backend", "history_max_count"}:
+            configure_history(self.config)
+        if "custom_icon_path" in changed:
+            self.icon.update_icon(self.config.get('custom_icon_path', ''))
+        if "auto_start" in changed:
+            self.handle_auto_start(self.config.get('auto_start', False))
+
+    def apply_server_config(self):
+        """按配置启动或停止本地 HTTP 翻译服务，服务始终使用当前的 translator"""
+        enabled = self.config.get("server_enabled", False)
+        port = self.config.get("server_port", 8765)
+        if self.server and (not enabled or self.server.server_address[1] != port):
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        if enabled and self.server is None:
+            try:
+                self.server = start_server(lambda: self.translator, port=port)
+            except OSError:
+                pass  # 端口被占用
+
+    def shutdown(self):
+        """退出前停止后台服务"""
+        self.scheduler.shutdown()
+        self.warmer.stop()
+        self.image_encoder.shutdown(wait=False)
+        if self.server:
+            self.server.shutdown()
+        flush_history()
 
     def handle_auto_start(self, enable):
         key_path = r"Software\Microsoft\Windows\CurrentVersion\Run"
@@ -177,6 +263,7 @@ class AppController(QObject):
                 self.current_text = text
                 self.current_image = None
                 self.show_icon_with_timer()
+                self.start_speculation()
         except: pass
 
     def on_request_direct_translate(self, x, y):
@@ -212,9 +299,14 @@ class AppController(QObject):
         # 启动新的5秒定时器
         self.icon_hide_timer = QTimer()
         self.icon_hide_timer.setSingleShot(True)
-        self.icon_hide_timer.timeout.connect(self.hide_icon)
+        self.icon_hide_timer.timeout.connect(self.dismiss_icon)
         self.icon_hide_timer.start(5000)
     
+    def dismiss_icon(self):
+        """图标超时或点击其它位置关闭（未点击图标）：放弃推测翻译"""
+        self.cancel_speculation()
+        self.hide_icon()
+
     def hide_icon(self):
         """隐藏图标"""
         self.icon.hide()
@@ -237,11 +329,11 @@ class AppController(QObject):
             if not ctypes.windll.user32.IsClipboardFormatAvailable(CF_BITMAP):
                 return  # 不是图片，直接返回
             
-            # 3. 确认是新图片，才读取一次 pixmap
+            # 3. 确认是新图片，才读取一次图片，并立即在后台编码；之后的翻译/重翻都复用这份编码结果
             clipboard = QApplication.clipboard()
-            pixmap = clipboard.pixmap()
-            if not pixmap.isNull():
-                self.current_image = pixmap
+            image = clipboard.image()
+            if not image.isNull():
+                self.current_image = self.image_encoder.submit(_encode_image, image)
                 self.current_text = ""
                 self.bridge.request_image_icon.emit()
         except:
@@ -258,48 +350,185 @@ class AppController(QObject):
 
     def do_translation(self):
         self.hide_icon()  # 使用统一的隐藏方法
-        self._translate_id += 1  # 生成新的翻译请求ID，使旧请求失效
-        tid = self._translate_id
         self.popup.display("正在请求接口...", self.last_pos)
+        self.popup.set_status("")
         
-        # 判断是文本翻译还是图片翻译
-        if self.current_image and not self.current_image.isNull():
+        self.cancel_prefetch()
+        # 弹窗上的翻译/重翻共用 "popup" 通道，新请求会取消尚未完成的旧请求
+        if self.current_image is not None:
             # 图片翻译
             engine = self.config.get("image_engine", "tencent")
-            t = threading.Thread(target=self._async_run_image, args=(self.current_image, self.last_pos, engine, tid))
-            t.daemon = True
-            t.start()
+            self.scheduler.submit("popup", self._async_run_image, self.current_image, self.last_pos, engine)
         else:
             # 文本翻译
             engine = self.config.get("engine", "google")
-            t = threading.Thread(target=self._async_run, args=(self.current_text, self.last_pos, engine, tid))
-            t.daemon = True
-            t.start()
+            speculation = self._claim_speculation(self.current_text, self.popup.get_target_lang(), engine)
+            self.scheduler.submit("popup", self._async_run, self.current_text, self.last_pos, engine, speculation)
+
+    # ── 推测翻译 ──
 
-    def _async_run_image(self, pixmap, pos, engine, tid):
-        """异步执行图片翻译"""
+    def start_speculation(self):
+        """图标出现时就在后台翻译当前文本并写入缓存（需开启 speculative_translation），
+        点击图标后的请求直接命中缓存；受每个引擎的每日字符预算限制"""
+        if not self.config.get("speculative_translation", False) or self.cache is None:
+            return
+        text, engine = self.current_text, self.config.get("engine", "google")
+        if engine in MULTI_ENGINE_MODES or len(text) > self.config.get("speculative_max_chars", 2000):
+            return
+        if self.translator.supports_stream(engine):
+            return  # 点击图标时流式请求首字更快，推测结果会被 _claim_speculation 丢弃
+        if not self.budget.allow(engine, len(text)):
+            return
         target_lang = self.popup.get_target_lang()
-        
-        # 将 QPixmap 转换为字节流
-        buffer = QBuffer()
-        buffer.open(QIODevice.WriteOnly)
-        pixmap.save(buffer, "PNG")
-        image_bytes = buffer.data().data()
-        buffer.close()
-        
-        result = self.translator.translate_image(image_bytes, target_lang, engine=engine)
-        if self._translate_id == tid:  # 仅当请求未被取消时才更新结果
+        done = threading.Event()
+        # 独立的 "speculative" 通道：新的划词会取消旧的推测；优先级低于弹窗请求
+        ticket = self.scheduler.submit("speculative", self._speculative_run, text, target_lang, engine, done, priority=1)
+        self.speculation = ((text, target_lang, engine), ticket, done)
+
+    def _speculative_run(self, ticket, text, target_lang, engine, done):
+        try:
+            self.translator.translate(text, target_lang, engine=engine, cancel=ticket)  # 成功的结果写入缓存
+        finally:
+            done.set()
+
+    def cancel_speculation(self):
+        self.scheduler.cancel("speculative")
+        self.speculation = None
+
+    def _claim_speculation(self, text, target_lang, engine):
+        """点击图标时取出与本次请求相同的推测翻译，供弹窗请求等待其完成；
+        不同的请求取消推测。流式引擎也取消推测，直接流式请求首字更快。"""
+        speculation, self.speculation = self.speculation, None
+        if speculation is None:
+            return None
+        if speculation[0] != (text, target_lang, engine) or self.translator.supports_stream(engine):
+            self.scheduler.cancel("speculative")
+            return None
+        return speculation
+
+    # ── 预取 ──
+
+    def start_prefetch(self, result):
+        """首个结果显示后，在后台预取另一种目标语言和 prefetch_engine 的译文写入缓存
+        （需开启 prefetch_alternates），弹窗中切换语言/引擎时直接命中缓存。
+        与推测翻译共用每日字符预算；图片只预取另一种语言。"""
+        if not self.config.get("prefetch_alternates", False) or self.cache is None or is_error(result):
+            return
+        target_lang = self.popup.get_target_lang()
+        other_lang = "en" if target_lang == "zh-CN" else "zh-CN"
+        if self.current_image is not None:
+            source, chars = self.current_image, len(result)  # 图片按译文长度估算用量
+            jobs = [(other_lang, self.config.get("image_engine", "tencent"))]
+        else:
+            source, chars = self.current_text, len(self.current_text)
+            engine = self.config.get("engine", "google")
+            secondary = self.config.get("prefetch_engine", "")
+            jobs = [(other_lang, engine)]
+            if secondary and secondary != engine:
+                jobs.append((target_lang, secondary))
+        jobs = [(lang, engine) for lang, engine in jobs
+                if engine not in MULTI_ENGINE_MODES and self.budget.allow(engine, chars)]
+        if not jobs:
+            return
+        events = {job: threading.Event() for job in jobs}
+        # 独立的 "prefetch" 通道，优先级最低：新的预取取消旧的，弹窗请求总是先执行
+        ticket = self.scheduler.submit("prefetch", self._prefetch_run, source, events, priority=2)
+        self.prefetch = (source, events, ticket)
+
+    def _prefetch_run(self, ticket, source, events):
+        try:
+            for (target_lang, engine), done in events.items():
+                if ticket.cancelled:
+                    break
+                if isinstance(source, str):
+                    self.translator.translate(source, target_lang, engine=engine, cancel=ticket)
+                elif source.exception() is None:  # 编码失败时首次翻译已报错，不再预取
+                    self.translator.translate_image(source.result(), target_lang, engine=engine, cancel=ticket)
+                done.set()
+        finally:
+            for done in events.values():
+                done.set()
+
+    def cancel_prefetch(self):
+        self.scheduler.cancel("prefetch")
+        self.prefetch = None
+
+    def _claim_prefetch(self, source, target_lang, engine):
+        """重翻的目标正在预取时，返回 (预取 ticket, 完成事件) 供重翻等待，避免重复请求"""
+        if self.prefetch is None or self.prefetch[0] != source:
+            return None
+        _, events, ticket = self.prefetch
+        done = events.get((target_lang, engine))
+        return None if done is None else (ticket, done)
+
+    def _wait_background(self, ticket, background):
+        """等后台的推测/预取请求完成（结果已在缓存中），本请求或后台请求被取消时不再等待"""
+        if background is None:
+            return
+        bg_ticket, done = background
+        while not done.wait(0.05):
+            if ticket.cancelled or bg_ticket.cancelled:
+                break
+
+    def get_diagnostics(self):
+        """返回请求队列深度和正在执行的请求数，用于诊断"""
+        return self.scheduler.stats()
+
+    def on_stream_delta(self, text, first):
+        """流式翻译：首段替换占位文字，之后逐段追加"""
+        self.popup.update_result(text, append=not first)
+
+    def _consume_stream(self, ticket, stream, timing):
+        """消费流式翻译，逐段推送到弹窗并上报耗时，返回完整结果"""
+        result = ""
+        for delta in stream:
+            if is_error(delta):
+                result = delta
+                break
+            first = not result
+            result += delta
+            if not ticket.cancelled:
+                self.stream_delta.emit(delta, first)
+        if not is_error(result):
+            result = result.strip()
+        if not ticket.cancelled and timing:
+            self.status_changed.emit(_format_timing(timing))
+        return result
+
+    def _run_text(self, ticket, text, target_lang, engine):
+        timing = {}
+        stream = self.translator.translate_stream(text, target_lang, engine=engine, cancel=ticket, timing=timing)
+        return self._consume_stream(ticket, stream, timing)
+
+    def _run_image(self, ticket, image, target_lang, engine):
+        """image 为编码任务的 Future；编码失败时返回 ErrorText，弹窗不会停在等待状态"""
+        try:
+            encoded = image.result()
+        except Exception as e:
+            return ErrorText(f"图片编码失败: {e}")
+        timing = {}
+        stream = self.translator.translate_image_stream(encoded, target_lang, engine=engine, cancel=ticket, timing=timing)
+        return self._consume_stream(ticket, stream, timing)
+
+    def _async_run_image(self, ticket, image, pos, engine):
+        """异步执行图片翻译；image 为检测到图片时提交的编码任务"""
+        target_lang = self.popup.get_target_lang()
+        result = self._run_image(ticket, image, target_lang, engine)
+        if not ticket.cancelled:  # 仅当请求未被取代时才更新结果
             self.translation_finished.emit(result, pos)
 
-    def _async_run(self, text, pos, engine, tid):
+    def _async_run(self, ticket, text, pos, engine, speculation=None):
+        if speculation is not None:
+            # 等推测翻译完成（结果已在缓存中）再走正常流程，避免重复请求
+            self._wait_background(ticket, speculation[1:])
         target_lang = self.popup.get_target_lang()
-        result = self.translator.translate(text, target_lang, engine=engine)
-        if self._translate_id == tid:  # 仅当请求未被取消时才更新结果
+        result = self._run_text(ticket, text, target_lang, engine)
+        if not ticket.cancelled:  # 仅当请求未被取代时才更新结果
             self.translation_finished.emit(result, pos)
 
     def show_result(self, text, pos):
         # 判断是文本翻译还是图片翻译
-        if self.current_image and not self.current_image.isNull():
+        if self.current_image is not None:
             engine = self.config.get("image_engine", "tencent")
             self.popup.display_with_source(text, pos, "[图片翻译]", engine=engine, is_image=True)
             # 保存历史记录
@@ -311,49 +540,41 @@ class AppController(QObject):
             # 保存历史记录
             max_count = self.config.get("history_max_count", 10)
             add_history_record(self.current_text, text, engine, self.popup.get_target_lang(), is_image=False, max_count=max_count)
+        self.start_prefetch(text)
 
     def show_history(self):
         """显示翻译历史记录窗口"""
-        history = load_history()
-        self.history_window.load_and_display(history)
+        self.history_window.refresh()
         self.history_window.show()
         self.history_window.activateWindow()
 
     def do_retranslation(self, engine, target_lang):
         """弹窗中切换引擎/语言时触发的重翻"""
-        self._translate_id += 1  # 生成新的翻译请求ID，使旧请求失效
-        tid = self._translate_id
+        self.popup.set_status("")
         # 使用 popup.is_image 标记来判断当前是文本翻译还是图片翻译
-        if self.popup.is_image and self.current_image and not self.current_image.isNull():
+        if self.popup.is_image and self.current_image is not None:
             # 图片重翻
-            t = threading.Thread(target=self._async_retranslate_image, args=(self.current_image, engine, target_lang, tid))
-            t.daemon = True
-            t.start()
+            prefetch = self._claim_prefetch(self.current_image, target_lang, engine)
+            self.scheduler.submit("popup", self._async_retranslate_image, self.current_image, engine, target_lang, prefetch)
         else:
             # 文本重翻
             source = self.popup.source_text
             if not source or source == "[图片翻译]":
                 return
-            t = threading.Thread(target=self._async_retranslate, args=(source, engine, target_lang, tid))
-            t.daemon = True
-            t.start()
+            prefetch = self._claim_prefetch(source, target_lang, engine)
+            self.scheduler.submit("popup", self._async_retranslate, source, engine, target_lang, prefetch)
 
-    def _async_retranslate(self, text, engine, target_lang, tid):
-        result = self.translator.translate(text, target_lang, engine=engine)
-        if self._translate_id == tid:  # 仅当请求未被取消时才更新结果
+    def _async_retranslate(self, ticket, text, engine, target_lang, prefetch=None):
+        self._wait_background(ticket, prefetch)
+        result = self._run_text(ticket, text, target_lang, engine)
+        if not ticket.cancelled:  # 仅当请求未被取代时才更新结果
             self.retranslation_finished.emit(result)
     
-    def _async_retranslate_image(self, pixmap, engine, target_lang, tid):
-        """异步执行图片重翻"""
-        # 将 QPixmap 转换为字节流
-        buffer = QBuffer()
-        buffer.open(QIODevice.WriteOnly)
-        pixmap.save(buffer, "PNG")
-        image_bytes = buffer.data().data()
-        buffer.close()
-        
-        result = self.translator.translate_image(image_bytes, target_lang, engine=engine)
-        if self._translate_id == tid:  # 仅当请求未被取消时才更新结果
+    def _async_retranslate_image(self, ticket, image, engine, target_lang, prefetch=None):
+        """异步执行图片重翻，复用首次翻译时的编码结果"""
+        self._wait_background(ticket, prefetch)
+        result = self._run_image(ticket, image, target_lang, engine)
+        if not ticket.cancelled:  # 仅当请求未被取代时才更新结果
             self.retranslation_finished.emit(result)
 
 if __name__ == "__main__":
@@ -409,6 +630,7 @@ if __name__ == "__main__":
     menu.addAction("历史记录 (History)", controller.show_history)
     menu.addSeparator()
     menu.addAction("退出 (Exit)", app.quit)
+    app.aboutToQuit.connect(controller.shutdown)
     tray.setContextMenu(menu)
     tray.show()
     
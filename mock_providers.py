@@ -0,0 +1,220 @@
+"""本地模拟翻译服务商：在一个 HTTP 服务里模拟 Google gtx、DeepL、Microsoft、腾讯云 TC3、
+火山引擎和 OpenAI chat/completions 接口，供离线压测使用（不校验签名和密钥）。
+
+    server = start_mock_server(latency_ms=50, jitter_ms=10, error_rate=0.01)
+    config["endpoint_overrides"] = server.endpoint_overrides()
+    config["ai_endpoint"] = server.url + "/v1"
+
+也可以单独运行（python mock_providers.py --latency 50），启动后在标准输出打印服务地址。
+
+译文为 "[目标语言] 原文"，response_scale 可把译文放大到原文的若干倍以模拟较大的响应体。
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+PROVIDER_HOSTS = (
+    "translate.googleapis.com",
+    "api-free.deepl.com",
+    "api.cognitive.microsofttranslator.com",
+    "tmt.tencentcloudapi.com",
+    "open.volcengineapi.com",
+    "api.openai.com",
+)
+
+def endpoint_overrides(url):
+    """用于配置 endpoint_overrides，把全部服务商域名指向 url"""
+    return {host: url for host in PROVIDER_HOSTS}
+
+class _MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # 响应头和响应体分两次写出，避免 Nagle + 延迟确认带来的 40ms 等待
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, obj):
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length) if length else b""
+
+    def do_HEAD(self):
+        # 与真实服务商一样保持连接（send_error 会关闭连接），供连接预热使用
+        self.send_response(404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path != "/translate_a/single":
+            self._reply(404, {"error": "not found"})
+            return
+        query = parse_qs(url.query)
+        if self.server.simulate("google"):
+            self._reply(503, {"error": "mock failure"})
+            return
+        text = self.server.render(query["q"][0], query["tl"][0])
+        self._reply(200, [[[text, query["q"][0], None, None, 10]], None, "en"])
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        body = self._body()
+        query = parse_qs(url.query)
+        if url.path == "/v2/translate":
+            self._deepl(parse_qs(body.decode("utf-8")))
+        elif url.path == "/translate":
+            self._microsoft(query["to"][0], json.loads(body))
+        elif url.path.endswith("/chat/completions"):
+            self._openai(json.loads(body))
+        elif url.path == "/" and self.headers.get("X-TC-Action"):
+            self._tencent(self.headers["X-TC-Action"], json.loads(body))
+        elif url.path == "/" and query.get("Action") == ["TranslateText"]:
+            self._volcano(json.loads(body))
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def _deepl(self, form):
+        if self.server.simulate("deepl"):
+            self._reply(503, {"message": "mock failure"})
+            return
+        target = form["target_lang"][0]
+        self._reply(200, {"translations": [{"detected_source_language": "EN", "text": self.server.render(t, target)}
+                                           for t in form["text"]]})
+
+    def _microsoft(self, target, items):
+        if self.server.simulate("microsoft"):
+            self._reply(503, {"error": {"code": 503000, "message": "mock failure"}})
+            return
+        self._reply(200, [{"translations": [{"text": self.server.render(item["text"], target), "to": target}]}
+                          for item in items])
+
+    def _tencent(self, action, payload):
+        if self.server.simulate("tencent"):
+            self._reply(200, {"Response": {"Error": {"Code": "InternalError", "Message": "mock failure"}}})
+            return
+        target = payload.get("Target", "zh")
+        if action == "TextTranslate":
+            response = {"TargetText": self.server.render(payload["SourceText"], target)}
+        elif action == "TextTranslateBatch":
+            response = {"TargetTextList": [self.server.render(t, target) for t in payload["SourceTextList"]]}
+        elif action == "ImageTranslate":
+            size = len(payload.get("Data", ""))
+            response = {"ImageRecord": {"Value": [
+                {"SourceText": f"line {i}", "TargetText": self.server.render(f"line {i}", target),
+                 "X": 0, "Y": 20 * i, "W": 200, "H": 18}
+                for i in range(max(1, min(20, size // 4096)))
+            ]}}
+        else:
+            response = {"Error": {"Code": "InvalidAction", "Message": action}}
+        response["RequestId"] = "mock"
+        self._reply(200, {"Response": response})
+
+    def _volcano(self, payload):
+        if self.server.simulate("volcano"):
+            self._reply(200, {"ResponseMetadata": {"Error": {"Code": "InternalError", "Message": "mock failure"}}})
+            return
+        target = payload["TargetLanguage"]
+        self._reply(200, {"TranslationList": [{"Translation": self.server.render(t, target)} for t in payload["TextList"]],
+                          "ResponseMetadata": {"RequestId": "mock"}})
+
+    def _openai(self, payload):
+        if self.server.simulate("ai"):
+            self._reply(500, {"error": {"message": "mock failure"}})
+            return
+        content = payload["messages"][-1]["content"]
+        if isinstance(content, list):  # 图片翻译
+            content = "image"
+        text = self.server.render(content, payload.get("model", ""))
+        if not payload.get("stream"):
+            self._reply(200, {"choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                                           "finish_reason": "stop"}]})
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        step = max(1, len(text) // 8)
+        for i in range(0, len(text), step):
+            chunk = {"choices": [{"index": 0, "delta": {"content": text[i:i + step]}}]}
+            self.wfile.write(b"data: " + json.dumps(chunk, ensure_ascii=False).encode("utf-8") + b"\n\n")
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+class MockProviderServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=0, jitter_ms=0, error_rate=0.0,
+                 response_scale=1, seed=None):
+        """latency_ms ± jitter_ms 为每个请求的模拟处理耗时；error_rate 为返回失败的概率；
+        response_scale 为译文相对原文的放大倍数"""
+        super().__init__((host, port), _MockHandler)
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.response_scale = max(1, int(response_scale))
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.hits = {}  # 引擎 -> 请求次数
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def endpoint_overrides(self):
+        return endpoint_overrides(self.url)
+
+    def simulate(self, engine):
+        """记录请求、按配置休眠，返回本次是否应模拟失败"""
+        with self._lock:
+            self.hits[engine] = self.hits.get(engine, 0) + 1
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            failed = self._random.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        return failed
+
+    def render(self, text, target):
+        return f"[{target}] " + " ".join([text] * self.response_scale)
+
+def start_mock_server(**kwargs):
+    """在后台线程启动模拟服务并返回 server；调用 server.shutdown() 停止"""
+    server = MockProviderServer(**kwargs)
+    threading.Thread(target=server.serve_forever, name="mock-providers", daemon=True).start()
+    return server
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="模拟翻译服务商接口")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=0, help="监听端口（默认随机）")
+    p.add_argument("--latency", type=float, default=0, help="处理耗时（毫秒）")
+    p.add_argument("--jitter", type=float, default=0, help="耗时抖动（毫秒）")
+    p.add_argument("--error-rate", type=float, default=0.0, help="失败概率")
+    p.add_argument("--response-scale", type=int, default=1, help="译文相对原文的放大倍数")
+    p.add_argument("--seed", type=int, help="随机种子")
+    args = p.parse_args(argv)
+
+    server = MockProviderServer(args.host, args.port, latency_ms=args.latency, jitter_ms=args.jitter,
+                                error_rate=args.error_rate, response_scale=args.response_scale, seed=args.seed)
+    print(server.url, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
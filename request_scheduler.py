@@ -0,0 +1,126 @@
+import heapq
+import itertools
+import threading
+
+from translator_engines import CancelToken
+
+class RequestTicket(CancelToken):
+    """一次提交的翻译请求；被取消后排队中的任务直接丢弃，运行中的任务的 HTTP 请求被中断。
+
+    ticket 本身就是 CancelToken，可直接传给 Translator.translate(cancel=...)。
+    """
+
+    def __init__(self, channel):
+        super().__init__()
+        self.channel = channel
+
+class RequestScheduler:
+    """有界工作线程池 + 优先队列。
+
+    同一 channel 上新提交的请求会取消该 channel 上所有未完成的旧请求，
+    连续多次划词只会真正执行最后一次；channel 为 None 的请求互不影响。
+    priority 越小越先执行；priority > 0 的后台请求最多占用 max_workers - 1 个线程，
+    始终留一个线程给 priority 0 的弹窗请求。
+    """
+
+    def __init__(self, max_workers=3):
+        self.max_workers = max(1, int(max_workers))
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = itertools.count()
+        self._latest = {}  # channel -> 最近一次提交的 ticket
+        self._workers = []
+        self._idle = 0
+        self._running = 0
+        self._low_running = 0  # 正在执行的 priority > 0 的请求数
+        self._shutdown = False
+
+    def submit(self, channel, fn, *args, priority=0):
+        """提交任务，fn 以 fn(ticket, *args) 的形式在工作线程中调用"""
+        ticket = RequestTicket(channel)
+        with self._cond:
+            if self._shutdown:
+                ticket.cancel()
+                return ticket
+            if channel is not None:
+                old = self._latest.get(channel)
+                if old is not None:
+                    old.cancel()
+                self._latest[channel] = ticket
+            heapq.heappush(self._heap, (priority, next(self._seq), ticket, fn, args))
+            # 按排队数与空闲线程数判断：已被唤醒但尚未取走任务的线程仍计为空闲，突发提交时也能及时扩容
+            if len(self._heap) > self._idle and len(self._workers) < self.max_workers:
+                t = threading.Thread(target=self._worker, name=f"translate-{len(self._workers)}", daemon=True)
+                self._workers.append(t)
+                t.start()
+            self._cond.notify()
+        return ticket
+
+    def cancel(self, channel):
+        """取消某个 channel 上未完成的请求"""
+        with self._cond:
+            ticket = self._latest.pop(channel, None)
+        if ticket is not None:
+            ticket.cancel()
+
+    def _runnable(self):
+        """队首的请求现在能否执行：后台请求不能占用为弹窗请求保留的线程"""
+        if not self._heap:
+            return False
+        return self._heap[0][0] <= 0 or self._low_running < max(1, self.max_workers - 1)
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._runnable() and not self._shutdown:
+                    self._idle += 1
+                    self._cond.wait()
+                    self._idle -= 1
+                if self._shutdown:
+                    return
+                priority, _, ticket, fn, args = heapq.heappop(self._heap)
+                if ticket.cancelled:
+                    continue  # 已被更新的请求取代，不再执行
+                low = priority > 0
+                self._running += 1
+                self._low_running += low
+            try:
+                fn(ticket, *args)
+            except Exception:
+                pass
+            finally:
+                with self._cond:
+                    self._running -= 1
+                    if low:
+                        self._low_running -= 1
+                        self._cond.notify()  # 排队中的后台请求可能在等这个线程
+                    if self._latest.get(ticket.channel) is ticket:
+                        del self._latest[ticket.channel]
+
+    @property
+    def queue_depth(self):
+        """排队中（未被取消）的请求数"""
+        with self._cond:
+            return sum(1 for item in self._heap if not item[2].cancelled)
+
+    @property
+    def in_flight(self):
+        """正在工作线程中执行的请求数"""
+        with self._cond:
+            return self._running
+
+    def stats(self):
+        with self._cond:
+            return {
+                "queued": sum(1 for item in self._heap if not item[2].cancelled),
+                "in_flight": self._running,
+                "workers": len(self._workers),
+            }
+
+    def shutdown(self):
+        with self._cond:
+            self._shutdown = True
+            for item in self._heap:
+                item[2].cancel()
+            self._heap.clear()
+            self._cond.notify_all()
@@ -0,0 +1,86 @@
+"""腾讯云 TC3-HMAC-SHA256 与火山引擎 HMAC-SHA256 请求签名
+
+派生签名密钥（日期 → 服务 → tc3_request / 日期 → 地域 → 服务 → request）只与密钥、日期、
+地域和服务有关，按这些参数缓存，同一天内每次请求只需一次 HMAC；规范请求中固定不变的部分
+按域名预先拼好。请求体只计算一次 SHA-256，调用方已算好时可通过 payload_hash 直接传入。
+"""
+import hashlib
+import hmac
+import time
+from functools import lru_cache
+
+def sha256_hex(payload):
+    """请求体的 SHA-256 十六进制摘要，payload 为 str 或 bytes 类对象"""
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+def _hmac(key, msg):
+    return hmac.new(key, msg.encode("utf-8"), hashlib.sha256).digest()
+
+# ── 腾讯云 TC3 ──
+
+@lru_cache(maxsize=32)
+def _tc3_signing_key(secret_key, date, service):
+    return _hmac(_hmac(_hmac(("TC3" + secret_key).encode("utf-8"), date), service), "tc3_request")
+
+@lru_cache(maxsize=32)
+def _tc3_canonical_prefix(host):
+    return f"POST\n/\n\ncontent-type:application/json\nhost:{host}\n\ncontent-type;host\n"
+
+def tc3_headers(secret_id, secret_key, host, service, version, region, action, payload,
+                timestamp=None, payload_hash=None):
+    """返回带 Authorization 的请求头；payload 为 JSON 请求体"""
+    if timestamp is None:
+        timestamp = int(time.time())
+    if payload_hash is None:
+        payload_hash = sha256_hex(payload)
+    date = time.strftime("%Y-%m-%d", time.gmtime(timestamp))
+    credential_scope = f"{date}/{service}/tc3_request"
+    canonical_request = _tc3_canonical_prefix(host) + payload_hash
+    string_to_sign = f"TC3-HMAC-SHA256\n{timestamp}\n{credential_scope}\n{sha256_hex(canonical_request)}"
+    key = _tc3_signing_key(secret_key, date, service)
+    signature = hmac.new(key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+    return {
+        "Authorization": f"TC3-HMAC-SHA256 Credential={secret_id}/{credential_scope}, "
+                         f"SignedHeaders=content-type;host, Signature={signature}",
+        "Content-Type": "application/json",
+        "Host": host,
+        "X-TC-Action": action,
+        "X-TC-Timestamp": str(timestamp),
+        "X-TC-Version": version,
+        "X-TC-Region": region,
+    }
+
+# ── 火山引擎 ──
+
+@lru_cache(maxsize=32)
+def _volcano_signing_key(secret_key, date, region, service):
+    return _hmac(_hmac(_hmac(_hmac(secret_key.encode("utf-8"), date), region), service), "request")
+
+@lru_cache(maxsize=32)
+def _volcano_canonical_prefix(host, query):
+    return f"POST\n/\n{query}\ncontent-type:application/json\nhost:{host}\nx-date:"
+
+def volcano_headers(access_key, secret_key, host, service, region, query, payload,
+                    timestamp=None, payload_hash=None):
+    """返回带 Authorization 的请求头；query 为已排序的查询字符串（如 Action=...&Version=...）"""
+    if timestamp is None:
+        timestamp = int(time.time())
+    if payload_hash is None:
+        payload_hash = sha256_hex(payload)
+    x_date = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime(timestamp))
+    date = x_date[:8]
+    credential_scope = f"{date}/{region}/{service}/request"
+    canonical_request = (_volcano_canonical_prefix(host, query) + x_date
+                         + "\n\ncontent-type;host;x-date\n" + payload_hash)
+    string_to_sign = f"HMAC-SHA256\n{x_date}\n{credential_scope}\n{sha256_hex(canonical_request)}"
+    key = _volcano_signing_key(secret_key, date, region, service)
+    signature = hmac.new(key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+    return {
+        "Content-Type": "application/json",
+        "Host": host,
+        "X-Date": x_date,
+        "Authorization": f"HMAC-SHA256 Credential={access_key}/{credential_scope}, "
+                         f"SignedHeaders=content-type;host;x-date, Signature={signature}",
+    }
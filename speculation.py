@@ -0,0 +1,32 @@
+"""推测翻译的用量预算
+
+推测翻译（图标出现时提前翻译、首个结果返回后预取其它语言或引擎）会请求用户可能并不需要的
+翻译。收费引擎按 speculative_daily_chars 限制每天用于推测翻译的字符数，超出后当天不再推测；
+未列出的引擎（如免费的 Google）不限制，限额为 0 的引擎从不推测。用量只记在内存中。
+"""
+import threading
+import time
+
+class SpeculationBudget:
+    def __init__(self, config):
+        self.config = config
+        self._used = {}  # 引擎 -> 今天已用字符数
+        self._day = None
+        self._lock = threading.Lock()
+
+    def allow(self, engine, chars):
+        """预算足够时记入用量并返回 True"""
+        limit = self.config.get("speculative_daily_chars", {}).get(engine)
+        with self._lock:
+            today = time.strftime("%Y-%m-%d")
+            if today != self._day:
+                self._day, self._used = today, {}
+            used = self._used.get(engine, 0)
+            if limit is not None and used + chars > limit:
+                return False
+            self._used[engine] = used + chars
+            return True
+
+    def used(self, engine):
+        with self._lock:
+            return self._used.get(engine, 0) if self._day == time.strftime("%Y-%m-%d") else 0
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from config_manager import get_app_dir
+
+CACHE_FILE = os.path.join(get_app_dir(), "translation_cache.db")
+
+def normalize_text(text):
+    """规范化待翻译文本：统一 Unicode 形式和换行，去掉首尾及行尾空白"""
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+    return "\n".join(line.rstrip() for line in text.strip().split("\n"))
+
+def make_key(*parts):
+    """由任意可 JSON 序列化的字段生成缓存键"""
+    raw = json.dumps(parts, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class TranslationCache:
+    """翻译结果两级缓存：内存 LRU + 磁盘 SQLite，按条数和存活时间淘汰"""
+
+    PRUNE_INTERVAL = 64  # 每写入多少条检查一次磁盘容量
+
+    def __init__(self, path=None, max_memory=512, max_disk=5000, max_age_days=30):
+        self.max_memory = max(1, int(max_memory))
+        self.max_disk = max(1, int(max_disk))
+        self.max_age = max_age_days * 86400 if max_age_days else None
+        self._mem = OrderedDict()  # key -> (value, created)
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self._db = None
+        if path:
+            try:
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute("CREATE TABLE IF NOT EXISTS cache ("
+                                 "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                                 "created REAL NOT NULL, accessed REAL NOT NULL)")
+                self._db.execute("CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache(accessed)")
+                self._db.commit()
+                self._prune_disk()
+            except sqlite3.Error:
+                # 磁盘缓存不可用时退化为纯内存缓存
+                self._db = None
+
+    def _expired(self, created, now):
+        return self.max_age is not None and now - created > self.max_age
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            item = self._mem.get(key)
+            if item is not None:
+                if not self._expired(item[1], now):
+                    self._mem.move_to_end(key)
+                    self.hits += 1
+                    return item[0]
+                del self._mem[key]
+            if self._db is not None:
+                try:
+                    row = self._db.execute("SELECT value, created FROM cache WHERE key=?", (key,)).fetchone()
+                    if row is not None:
+                        if self._expired(row[1], now):
+                            self._db.execute("DELETE FROM cache WHERE key=?", (key,))
+                        else:
+                            self._db.execute("UPDATE cache SET accessed=? WHERE key=?", (now, key))
+                        self._db.commit()
+                        if not self._expired(row[1], now):
+                            self._remember(key, row[0], row[1])
+                            self.hits += 1
+                            return row[0]
+                except sqlite3.Error:
+                    pass
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            if self._db is None:
+                return
+            try:
+                self._db.execute("INSERT OR REPLACE INTO cache (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                                 (key, value, now, now))
+                self._db.commit()
+                self._writes += 1
+                if self._writes % self.PRUNE_INTERVAL == 0:
+                    self._prune_disk()
+            except sqlite3.Error:
+                pass
+
+    def _remember(self, key, value, created):
+        self._mem[key] = (value, created)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_memory:
+            self._mem.popitem(last=False)
+
+    def _prune_disk(self):
+        """删除过期条目，并按最近访问时间裁剪到 max_disk 条"""
+        if self.max_age is not None:
+            self._db.execute("DELETE FROM cache WHERE created < ?", (time.time() - self.max_age,))
+        self._db.execute("DELETE FROM cache WHERE key IN (SELECT key FROM cache "
+                         "ORDER BY accessed DESC LIMIT -1 OFFSET ?)", (self.max_disk,))
+        self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            if self._db is not None:
+                try:
+                    self._db.execute("DELETE FROM cache")
+                    self._db.commit()
+                except sqlite3.Error:
+                    pass
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+def open_cache(config):
+    """根据配置创建缓存；关闭缓存时返回 None"""
+    if not config.get("cache_enabled", True):
+        return None
+    return TranslationCache(CACHE_FILE,
+                            max_memory=config.get("cache_memory_size", 512),
+                            max_disk=config.get("cache_disk_size", 5000),
+                            max_age_days=config.get("cache_max_age_days", 30))
@@ -0,0 +1,211 @@
+"""本地 HTTP 翻译服务：把翻译引擎以 JSON 接口提供给本机其它工具
+
+    python translation_server.py --port 8765
+
+POST /translate        {"text": "...", "target_lang": "zh-CN", "engine": "google"}
+POST /translate_image  {"image": "<base64>", "target_lang": "zh-CN", "engine": "tencent"}
+POST /translate_batch  {"texts": ["...", "..."], "target_lang": "en", "engine": "deepl"}
+GET  /health           服务状态与统计
+
+engine / target_lang 可省略，默认使用配置中的引擎和 zh-CN。所有客户端共享同一个
+Translator（缓存与连接池），内容完全相同的并发请求只会向翻译服务商请求一次。
+
+只接受本机工具的请求：POST 必须是 Content-Type: application/json，带 Origin 头的请求
+（浏览器中的网页发起）一律拒绝，Host 必须是 127.0.0.1/localhost 加监听端口（防 DNS 重绑定）。
+"""
+import argparse
+import base64
+import binascii
+import hashlib
+import json
+import sys
+import threading
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from translation_cache import make_key, normalize_text
+from translator_engines import is_error
+
+class RequestCoalescer:
+    """合并相同的并发请求：同一 key 正在处理时，后到的请求等待并共享第一个请求的结果"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.coalesced = 0
+
+    def run(self, key, fn):
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not owner:
+            return future.result()
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "SelectionTranslator"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, obj):
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _forbidden(self):
+        """拒绝网页发起的请求（CSRF）和 Host 不是本机地址的请求（DNS 重绑定）"""
+        if self.headers.get("Origin") is not None:
+            return True
+        return self.headers.get("Host", "").lower() not in self.server.allowed_hosts
+
+    def do_GET(self):
+        if self._forbidden():
+            self._reply(403, {"error": "forbidden"})
+            return
+        if self.path != "/health":
+            self._reply(404, {"error": "not found"})
+            return
+        self.server.count_request()
+        self._reply(200, self.server.stats())
+
+    def do_POST(self):
+        routes = {
+            "/translate": self._translate,
+            "/translate_image": self._translate_image,
+            "/translate_batch": self._translate_batch,
+        }
+        if self._forbidden():
+            self._reply(403, {"error": "forbidden"})
+            return
+        handler = routes.get(self.path)
+        if handler is None:
+            self._reply(404, {"error": "not found"})
+            return
+        content_type = self.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type != "application/json":
+            self._reply(415, {"error": "Content-Type must be application/json"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(body, dict):
+                raise ValueError("body must be a JSON object")
+            self.server.count_request()
+            self._reply(200, handler(body, self.server.get_translator()))
+        except (ValueError, KeyError, TypeError, binascii.Error) as e:
+            self._reply(400, {"error": f"bad request: {e}"})
+        except Exception as e:
+            self._reply(500, {"error": f"internal error: {e}"})
+
+    def _translate(self, body, translator):
+        text = body["text"]
+        target_lang = body.get("target_lang", "zh-CN")
+        engine = body.get("engine") or translator.config.get("engine", "google")
+        key = make_key("text", normalize_text(text), engine, target_lang)
+        result = self.server.coalescer.run(key, lambda: translator.translate(text, target_lang, engine=engine))
+        return _result_json(result)
+
+    def _translate_image(self, body, translator):
+        image_bytes = base64.b64decode(body["image"], validate=True)
+        target_lang = body.get("target_lang", "zh-CN")
+        engine = body.get("engine") or translator.config.get("image_engine", "tencent")
+        key = make_key("image", hashlib.sha256(image_bytes).hexdigest(), engine, target_lang)
+        result = self.server.coalescer.run(key, lambda: translator.translate_image(image_bytes, target_lang, engine=engine))
+        return _result_json(result)
+
+    def _translate_batch(self, body, translator):
+        texts = body["texts"]
+        if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+            raise ValueError("texts must be a list of strings")
+        target_lang = body.get("target_lang", "zh-CN")
+        engine = body.get("engine") or translator.config.get("engine", "google")
+        key = make_key("batch", [normalize_text(t) for t in texts], engine, target_lang)
+        results = self.server.coalescer.run(key, lambda: translator.translate_batch(texts, target_lang, engine=engine))
+        return {
+            "results": [None if is_error(r) else r for r in results],
+            "errors": {str(i): r for i, r in enumerate(results) if is_error(r)},
+        }
+
+def _result_json(result):
+    if is_error(result):
+        return {"ok": False, "error": result}
+    return {"ok": True, "result": result}
+
+class TranslationServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, get_translator, host="127.0.0.1", port=8765):
+        """get_translator 返回当前使用的翻译器，GUI 修改配置后重建的翻译器也能立即生效"""
+        super().__init__((host, port), _Handler)
+        self.get_translator = get_translator
+        self.coalescer = RequestCoalescer()
+        self.requests = 0
+        self._lock = threading.Lock()
+        port = self.server_address[1]
+        self.allowed_hosts = {f"{h}:{port}" for h in ("127.0.0.1", "localhost", host)}
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def stats(self):
+        translator = self.get_translator()
+        cache = translator.cache
+        return {
+            "ok": True,
+            "requests": self.requests,
+            "coalesced": self.coalescer.coalesced,
+            "cache_hits": cache.hits if cache is not None else 0,
+            "cache_misses": cache.misses if cache is not None else 0,
+        }
+
+def start_server(get_translator, host="127.0.0.1", port=8765):
+    """在后台线程启动服务并返回 server；调用 server.shutdown() 停止"""
+    server = TranslationServer(get_translator, host, port)
+    threading.Thread(target=server.serve_forever, name="translation-server", daemon=True).start()
+    return server
+
+def main(argv=None):
+    from config_manager import load_config
+    from translation_cache import open_cache
+    from async_translator import create_translator
+
+    p = argparse.ArgumentParser(description="本地 HTTP 翻译服务")
+    p.add_argument("--host", default="127.0.0.1", help="监听地址（默认仅本机）")
+    p.add_argument("--port", type=int, help="监听端口（默认使用配置中的 server_port）")
+    p.add_argument("--config", help="配置文件路径")
+    args = p.parse_args(argv)
+
+    config = load_config(args.config)
+    translator = create_translator(config, cache=open_cache(config))
+    port = args.port or config.get("server_port", 8765)
+    server = TranslationServer(lambda: translator, args.host, port)
+    print(f"翻译服务已启动: http://{args.host}:{server.server_address[1]}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        translator.close()
+
+if __name__ == "__main__":
+    main()
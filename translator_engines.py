@@ -1,23 +1,277 @@
 ﻿import requests
 import urllib3
-import hashlib
-import hmac
 import time
 import json
-import base64
-from datetime import datetime
+import binascii
+import hashlib
+import socket
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from image_pipeline import (PREPROCESS_STATS, EncodedImage, ImageCache, ImageRecord, ImageTranslation,
+                            as_encoded_image, engine_settings, image_mime, preprocess_image)
+from request_signing import tc3_headers, volcano_headers
+from translation_cache import normalize_text, make_key
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# ── 可取消的 HTTP 请求 ──
+_active = threading.local()  # 当前线程正在执行的翻译请求所绑定的 CancelToken
+
+class CancelledError(Exception):
+    pass
+
+class CancelToken:
+    """取消令牌：cancel() 会立即关闭该请求正在使用的 socket，使阻塞中的读取马上返回"""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._socks = set()
+        self._callbacks = []
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            self._event.set()
+            socks, self._socks = self._socks, set()
+            callbacks, self._callbacks = self._callbacks, []
+        for sock in socks:
+            _abort_socket(sock)
+        for callback in callbacks:
+            callback()
+
+    def add_callback(self, callback):
+        """注册取消时调用的回调；已取消时立即调用"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def child(self):
+        """创建子令牌：本令牌取消时子令牌一并取消，子令牌可单独取消"""
+        token = CancelToken()
+        self.add_callback(token.cancel)
+        return token
+
+    def _attach(self, sock):
+        with self._lock:
+            if not self._event.is_set():
+                self._socks.add(sock)
+                return
+        _abort_socket(sock)
+
+    def _detach(self, sock):
+        with self._lock:
+            self._socks.discard(sock)
+
+def _abort_socket(sock):
+    try:
+        # 直接调用 socket.socket.shutdown，绕过 SSLSocket 的实现，避免与读线程争用 SSL 对象
+        socket.socket.shutdown(sock, socket.SHUT_RDWR)
+    except (OSError, TypeError):
+        pass
+
+@contextmanager
+def _bind_token(token):
+    previous = getattr(_active, "token", None)
+    _active.token = token
+    try:
+        yield
+    finally:
+        _active.token = previous
+
+class ConnectionStats:
+    """requests 后端的连接复用统计：请求数和新建连接数（预热和保活请求不计入）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connects = 0
+
+    def _record(self, field):
+        if getattr(_active, "warming", False):
+            return
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def reset(self):
+        with self._lock:
+            self.requests = self.connects = 0
+
+    def snapshot(self):
+        """返回 {"requests", "connects", "reuse_ratio"}，reuse_ratio 为复用已有连接的请求比例"""
+        with self._lock:
+            requests_, connects = self.requests, self.connects
+        ratio = max(0.0, 1 - connects / requests_) if requests_ else 0.0
+        return {"requests": requests_, "connects": connects, "reuse_ratio": ratio}
+
+CONNECTION_STATS = ConnectionStats()
+
+class _CancellableConnectionMixin:
+    def connect(self):
+        CONNECTION_STATS._record("connects")
+        super().connect()
+        token = getattr(_active, "token", None)
+        if token is not None and self.sock is not None:
+            token._attach(self.sock)
+
+    def request(self, *args, **kwargs):
+        CONNECTION_STATS._record("requests")
+        token = getattr(_active, "token", None)
+        if token is not None:
+            if token.cancelled:
+                raise CancelledError("request cancelled")
+            if self.sock is not None:  # 复用的 keep-alive 连接
+                token._attach(self.sock)
+        return super().request(*args, **kwargs)
+
+class _CancellableHTTPConnection(_CancellableConnectionMixin, HTTPConnection):
+    pass
+
+class _CancellableHTTPSConnection(_CancellableConnectionMixin, HTTPSConnection):
+    pass
+
+class _CancellablePoolMixin:
+    def _put_conn(self, conn):
+        # 连接归还连接池后不再属于当前请求，取消时不能再关闭它
+        token = getattr(_active, "token", None)
+        if token is not None and conn is not None and conn.sock is not None:
+            token._detach(conn.sock)
+        super()._put_conn(conn)
+
+class _CancellableHTTPPool(_CancellablePoolMixin, HTTPConnectionPool):
+    ConnectionCls = _CancellableHTTPConnection
+
+class _CancellableHTTPSPool(_CancellablePoolMixin, HTTPSConnectionPool):
+    ConnectionCls = _CancellableHTTPSConnection
+
+_POOL_CLASSES = {"http": _CancellableHTTPPool, "https": _CancellableHTTPSPool}
+
+class _CancellableAdapter(HTTPAdapter):
+    """让连接池使用可被 CancelToken 中断的连接"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = _POOL_CLASSES
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        if not proxy.lower().startswith("socks"):
+            manager.pool_classes_by_scheme = _POOL_CLASSES
+        return manager
+
+class HttpRequest:
+    """一次 HTTP 调用的描述，与具体的 HTTP 客户端无关；mode 为代理模式 (auto/manual/direct)"""
+
+    def __init__(self, method, url, mode, params=None, headers=None, data=None, json=None, timeout=10):
+        self.method = method
+        self.url = url
+        self.mode = mode
+        self.params = params
+        self.headers = headers
+        self.data = data
+        self.json = json
+        self.timeout = timeout
+
+class ErrorText(str):
+    """翻译失败时返回的提示文本；仍是 str，调用方可直接显示，但不会被写入缓存"""
+
+def is_error(result):
+    return isinstance(result, ErrorText)
+
+# ── 图片请求体 ──
+_BASE64_SLOT = "\x00base64\x00"  # JSON 中待替换为图片 base64 的占位字符串
+_BASE64_CHUNK = 3 * 64 * 1024     # 每次编码的原始字节数（3 的倍数，分块编码结果可直接拼接）
+
+def _json_with_base64(obj, data):
+    """把 obj 序列化为 JSON 请求体，其中的 _BASE64_SLOT 替换为 data 的 base64。
+
+    请求体按最终长度一次分配，base64 分块直接写入并同时计算 SHA-256，
+    不产生完整的 base64 字符串、JSON 字符串及其编码副本。返回 (bytearray, sha256 十六进制)。
+    """
+    marker = json.dumps(_BASE64_SLOT)[1:-1].encode("ascii")
+    head, tail = json.dumps(obj).encode("utf-8").split(marker)
+    view = memoryview(data)
+    body = bytearray(len(head) + (len(view) + 2) // 3 * 4 + len(tail))
+    digest = hashlib.sha256(head)
+    body[:len(head)] = head
+    pos = len(head)
+    for i in range(0, len(view), _BASE64_CHUNK):
+        chunk = binascii.b2a_base64(view[i:i + _BASE64_CHUNK], newline=False)
+        body[pos:pos + len(chunk)] = chunk
+        digest.update(chunk)
+        pos += len(chunk)
+    body[pos:] = tail
+    digest.update(tail)
+    return body, digest.hexdigest()
+
+def _overlap_lines(previous, current):
+    """current 开头与 previous 末尾相同的行数（忽略首尾空白）"""
+    for k in range(min(len(previous), len(current)), 0, -1):
+        if [s.strip() for s in previous[-k:]] == [s.strip() for s in current[:k]]:
+            return k
+    return 0
+
+def _first(results):
+    """单条请求复用批量解析：取第一条结果，错误原样返回"""
+    return results if is_error(results) else results[0]
+
+TEXT_ENGINES = ("google", "deepl", "tencent", "microsoft", "volcano", "ai")
+MULTI_ENGINE_MODES = ("race", "hedge")  # 竞速：同时请求多个引擎；对冲：超时后才请求后备引擎
+
 class Translator:
-    def __init__(self, config):
+    LATENCY_WINDOW = 50  # 每个引擎保留最近多少次成功耗时，用于计算对冲延迟
+    MULTI_CALLERS = 8  # 同时进行的竞速/对冲请求数（弹窗、预取、本地服务等），线程池按此放大
+
+    def __init__(self, config, cache=None):
         self.config = config
+        self.cache = cache  # TranslationCache，可为 None
+        self.image_cache = ImageCache(cache, config.get("image_cache_distance", 4)) if cache is not None else None
         self.headers = {"User-Agent": "Mozilla/5.0"}
         self.sessions = {}
+        self._last_used = {}  # 源站 (scheme://host/) -> 最近一次请求或预热的时间 (monotonic)
+        self.last_request = 0.0  # 最近一次翻译请求的时间 (monotonic)
+        self._latency = {}  # engine -> deque[秒]
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def close(self):
+        """关闭连接池和竞速线程池"""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+        for session in self.sessions.values():
+            session.close()
+        self.sessions.clear()
+
+    def config_changed(self, changed):
+        """配置原地修改后调用，changed 为变化的键。其余配置在每次请求时实时读取，
+        这里只处理初始化时确定的状态：代理地址变化时关闭 manual 模式的连接池，其它连接保持。"""
+        if "proxy_url" in changed:
+            session = self.sessions.pop("manual", None)
+            if session is not None:
+                session.close()
+        if "image_cache_distance" in changed and self.image_cache is not None:
+            self.image_cache.max_distance = max(0, int(self.config.get("image_cache_distance", 4)))
 
     def _get_session(self, mode):
         if mode not in self.sessions:
             session = requests.Session()
+            adapter = _CancellableAdapter()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
             if mode == "manual":
                 proxy_url = self.config.get("proxy_url", "http://127.0.0.1:7897")
                 session.proxies = {"http": proxy_url, "https": proxy_url}
@@ -29,67 +283,624 @@ class Translator:
             self.sessions[mode] = session
         return self.sessions[mode]
 
-    def translate(self, text, target_lang="zh-CN", engine=None):
-        if not text: return "No text selected."
+    def translate(self, text, target_lang="zh-CN", engine=None, cancel=None):
+        """文本翻译接口；cancel 为 CancelToken，取消后正在进行的 HTTP 请求会被立即中断"""
+        if not text: return ErrorText("No text selected.")
         
         # 如果指定了引擎，使用指定的；否则使用配置中的默认引擎
         if engine is None:
             engine = self.config.get("engine", "google")
         
+        if engine in MULTI_ENGINE_MODES:
+            return self._translate_multi(text, target_lang, engine, cancel)
+        
+        key = self._cache_key(text, target_lang, engine)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        
+        start = time.perf_counter()
+        with _bind_token(cancel):
+            result = self._dispatch(text, target_lang, engine)
+        if cancel is not None and cancel.cancelled:
+            return ErrorText("翻译已取消")
+        if not is_error(result):
+            self._record_latency(engine, time.perf_counter() - start)
+            if key is not None:
+                self.cache.put(key, result)
+        return result
+
+    # ========== 多引擎竞速 / 对冲 ==========
+
+    def _record_latency(self, engine, seconds):
+        with self._pool_lock:
+            self._latency.setdefault(engine, deque(maxlen=self.LATENCY_WINDOW)).append(seconds)
+
+    def latency_percentile(self, engine, pct=90):
+        """引擎最近成功请求耗时的百分位数（秒）；样本不足 5 个时返回 None"""
+        with self._pool_lock:
+            samples = sorted(self._latency.get(engine, ()))
+        if len(samples) < 5:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                # 线程按需创建；每个竞速/对冲请求最多占用 len(TEXT_ENGINES) 个线程，并发的请求互不排队
+                self._pool = ThreadPoolExecutor(max_workers=self.MULTI_CALLERS * len(TEXT_ENGINES),
+                                                thread_name_prefix="race")
+            return self._pool
+
+    def _race_engines(self):
+        engines = self.config.get("race_engines", ["google", "microsoft", "volcano"])
+        return [e for e in engines if e in TEXT_ENGINES]
+
+    def _hedge_delay(self, engine):
+        """对冲延迟：主引擎 p90 耗时，样本不足时使用配置的默认值"""
+        p90 = self.latency_percentile(engine, 90)
+        if p90 is None:
+            return self.config.get("hedge_delay_ms", 1000) / 1000
+        return min(5.0, max(0.2, p90))
+
+    def _translate_multi(self, text, target_lang, mode, cancel):
+        """race 同时请求全部引擎；hedge 先请求首个引擎，超过其 p90 耗时或失败后再启动下一个。
+        采用最先成功的结果，并中断其余引擎的请求。"""
+        engines = self._race_engines()
+        if not engines:
+            return ErrorText("请在设置中配置竞速引擎列表")
+        if self.cache is not None:
+            for e in engines:
+                cached = self.cache.get(self._cache_key(text, target_lang, e))
+                if cached is not None:
+                    return cached
+
+        parent = cancel if cancel is not None else CancelToken()
+        pool = self._get_pool()
+        futures, tokens = {}, {}
+        waiting = list(engines)
+
+        def launch():
+            e = waiting.pop(0)
+            tokens[e] = parent.child()
+            futures[pool.submit(self.translate, text, target_lang, e, tokens[e])] = e
+
+        if mode == "race":
+            while waiting:
+                launch()
+        else:
+            delay = self._hedge_delay(engines[0])
+            launch()
+
+        last_error = None
+        while futures:
+            timeout = delay if mode == "hedge" and waiting else None
+            done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                launch()  # 主引擎迟迟未返回，发出对冲请求
+                continue
+            for f in done:
+                e = futures.pop(f)
+                result = f.result()
+                if not is_error(result):
+                    for other, token in tokens.items():
+                        if other != e:
+                            token.cancel()
+                    return result
+                last_error = result
+                if waiting:
+                    launch()  # 失败时立即启用下一个引擎
+        if cancel is not None and cancel.cancelled:
+            return ErrorText("翻译已取消")
+        return last_error
+
+    # ========== 批量翻译 ==========
+
+    # 引擎: (单次请求最多段数, 单次请求最多字符数)
+    BATCH_LIMITS = {
+        "deepl": (50, 30000),        # 单次最多 50 段，请求体不超过 128 KiB
+        "microsoft": (1000, 50000),
+        "tencent": (100, 6000),
+        "volcano": (16, 5000),
+    }
+
+    def translate_batch(self, texts, target_lang="zh-CN", engine=None, cancel=None):
+        """批量翻译，按输入顺序返回结果列表，失败的条目为 ErrorText，空白条目原样返回。
+
+        DeepL/微软/腾讯/火山按各自单次请求的段数和字符数上限打包，其余引擎逐条请求；
+        各请求最多 batch_concurrency 个并发。命中缓存和重复的文本不会再次请求。
+        """
+        if engine is None:
+            engine = self.config.get("engine", "google")
+        results, chunks = self._plan_batch(texts, target_lang, engine)
+        if chunks:
+            workers = min(len(chunks), max(1, int(self.config.get("batch_concurrency", 4))))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as pool:
+                done = pool.map(lambda chunk: self._run_batch_chunk(chunk, target_lang, engine, cancel), chunks)
+                for chunk, chunk_results in zip(chunks, done):
+                    self._fill_batch(results, chunk, chunk_results, target_lang, engine)
+        return results
+
+    def _plan_batch(self, texts, target_lang, engine):
+        """查缓存、合并重复文本并按引擎限制分组；返回 (结果列表, 待请求分组)。
+        每个分组是 [原文, [下标...], 缓存键] 的列表。"""
+        results = [None] * len(texts)
+        pending = {}
+        for i, text in enumerate(texts):
+            if not text or not text.strip():
+                results[i] = text
+                continue
+            key = self._cache_key(text, target_lang, engine)
+            if key is not None:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    results[i] = cached
+                    continue
+            item = pending.setdefault(normalize_text(text), [text, [], key])
+            item[1].append(i)
+
+        items = list(pending.values())
+        limit = self.BATCH_LIMITS.get(engine)
+        if limit is None or self._batch_engine_spec(engine) is None:
+            return results, [[item] for item in items]
+        max_count, max_chars = limit
+        chunks, current, chars = [], [], 0
+        for item in items:
+            if current and (len(current) >= max_count or chars + len(item[0]) > max_chars):
+                chunks.append(current)
+                current, chars = [], 0
+            current.append(item)
+            chars += len(item[0])
+        if current:
+            chunks.append(current)
+        return results, chunks
+
+    def _run_batch_chunk(self, chunk, target_lang, engine, cancel):
+        spec = self._batch_engine_spec(engine)
+        if spec is None:
+            return [self.translate(chunk[0][0], target_lang, engine=engine, cancel=cancel)]
+        texts = [item[0] for item in chunk]
+        with _bind_token(cancel):
+            try:
+                result = self._execute(spec, texts, target_lang)
+            except Exception as e:
+                result = ErrorText(f"Error: {str(e)}")
+        return self._check_batch_result(result, len(texts), cancel)
+
+    def _check_batch_result(self, result, count, cancel):
+        if cancel is not None and cancel.cancelled:
+            result = ErrorText("翻译已取消")
+        if not is_error(result) and len(result) != count:
+            result = ErrorText(f"批量翻译返回 {len(result)} 条结果，应为 {count} 条")
+        if is_error(result):
+            return [result] * count
+        return result
+
+    def _fill_batch(self, results, chunk, chunk_results, target_lang, engine):
+        batched = self._batch_engine_spec(engine) is not None  # 逐条请求的结果已由 translate 写入缓存
+        for (text, indices, key), result in zip(chunk, chunk_results):
+            if batched and key is not None and not is_error(result):
+                self.cache.put(key, result)
+            for i in indices:
+                results[i] = result
+
+    def _cache_key(self, text, target_lang, engine):
+        """缓存键：规范化原文 + 引擎 + 目标语言；AI 引擎额外包含接口、模型和提示词"""
+        if self.cache is None:
+            return None
+        extra = ()
+        if engine == "ai":
+            extra = (self.config.get("ai_endpoint", ""), self.config.get("ai_model", ""), self.config.get("ai_prompt", ""))
+        return make_key("text", normalize_text(text), engine, target_lang, *extra)
+
+    def _dispatch(self, text, target_lang, engine):
         try:
-            if engine == "google":
-                return self._google_translate(text, target_lang)
-            elif engine == "deepl":
-                return self._deepl_translate(text, target_lang)
-            elif engine == "tencent":
-                return self._tencent_translate(text, target_lang)
-            elif engine == "microsoft":
-                return self._microsoft_translate(text, target_lang)
-            elif engine == "volcano":
-                return self._volcano_translate(text, target_lang)
-            elif engine == "ai":
-                return self._ai_translate(text, target_lang)
+            result = self._execute(self._text_engine_spec(engine), text, target_lang)
         except Exception as e:
-            return f"Error: {str(e)}"
-        return "Unknown Engine"
+            return ErrorText(f"Error: {str(e)}")
+        return result if result is not None else ErrorText("Unknown Engine")
     
-    def translate_image(self, image_bytes, target_lang="zh-CN", engine=None):
-        """图片翻译接口"""
+    def translate_image(self, image_bytes, target_lang="zh-CN", engine=None, cancel=None):
+        """图片翻译接口；image_bytes 为图片字节或 EncodedImage"""
         if not image_bytes:
-            return "No image provided."
+            return ErrorText("No image provided.")
         
         # 如果指定了引擎，使用指定的；否则使用配置中的图片翻译引擎
         if engine is None:
             engine = self.config.get("image_engine", "tencent")
         
+        image = as_encoded_image(image_bytes)
+        cached = self._image_cache_get(image, target_lang, engine)
+        if cached is not None:
+            return cached
+        layout = self._image_layout(image, engine)
+        if layout is not None:
+            result = self._retranslate_layout(layout, self.translate_batch(
+                [r.source for r in layout.records], target_lang, engine=engine, cancel=cancel))
+            if result is not None:
+                self._image_cache_put(image, target_lang, engine, result)
+                return result
+        tiles = self._image_tiles(image, engine)
+        if tiles:
+            return self._translate_tiled_image(image, tiles, target_lang, engine, cancel)
+        data, info = self.prepare_image(image, engine)
+        return self._translate_prepared_image(image, data, target_lang, engine, cancel, info)
+
+    def prepare_image(self, image, engine):
+        """按引擎的 image_preprocess 配置缩小/重新编码图片，返回 (图片字节, 预处理说明或 None)。
+        image 为 EncodedImage 时预处理结果会被缓存，重翻时不再重复处理。"""
+        if isinstance(image, EncodedImage):
+            if self._image_engine_spec(engine) is None:
+                return image.data, None
+            return image.prepared(engine_settings(self.config, engine))
+        if self._image_engine_spec(engine) is None:
+            return image, None
+        return preprocess_image(image, engine_settings(self.config, engine))
+
+    def _translate_prepared_image(self, image, data, target_lang, engine, cancel, info):
+        start = time.perf_counter()
+        with _bind_token(cancel):
+            result = self._dispatch_image(data, target_lang, engine)
+        if cancel is not None and cancel.cancelled:
+            return ErrorText("翻译已取消")
+        if info is not None:
+            PREPROCESS_STATS.record(info, time.perf_counter() - start)
+            if isinstance(result, ImageTranslation):
+                result = result.mapped(info["scale"], info["offset"])
+        self._image_cache_put(image, target_lang, engine, result)
+        return result
+
+    # ========== 按版面重翻 ==========
+    # 腾讯图片翻译返回各文字区域的原文和坐标。同一张图换目标语言时，只需把这些原文走批量文本翻译，
+    # 不必重新上传图片做识别；各区域的译文在文本缓存里，识别结果相同的区域不会再次请求。
+
+    def _image_layout(self, image, engine):
+        """同一张图片之前由 engine 识别出的版面（ImageTranslation），仅支持批量文本翻译的引擎"""
+        if self.image_cache is None or self._batch_engine_spec(engine) is None:
+            return None
+        records = self.image_cache.layout(image, engine)
+        return ImageTranslation(records) if records else None
+
+    def _retranslate_layout(self, layout, targets):
+        """把批量翻译结果填回版面；有失败的区域时返回 None，由调用方退回整图翻译"""
+        if is_error(targets) or any(is_error(t) for t in targets):
+            return None
+        return layout.retargeted(targets)
+
+    # ========== 长截图分块翻译 ==========
+
+    def _image_tiles(self, image, engine):
+        """高度超过 image_tile_height 的长截图切成重叠的横条（ImageTile 列表），否则返回 None"""
+        tile_height = self.config.get("image_tile_height", 2000)
+        if not tile_height or self._image_engine_spec(engine) is None:
+            return None
+        overlap = self.config.get("image_tile_overlap", 120)
+        # 横条本身不长，按引擎参数缩放编码即可；不裁边框，保证坐标可换算回原图
+        settings = dict(engine_settings(self.config, engine), crop_borders=False)
+        return image.tiles(tile_height, overlap, settings)
+
+    def _translate_tiled_image(self, image, tiles, target_lang, engine, cancel):
+        """各横条最多 image_tile_concurrency 个并发请求，按从上到下的顺序拼接结果"""
+        spec = self._image_engine_spec(engine)
+
+        def run(tile):
+            with _bind_token(cancel):
+                try:
+                    return self._execute(spec, tile.data, target_lang)
+                except Exception as e:
+                    return ErrorText(f"图片翻译失败: {str(e)}")
+
+        workers = min(len(tiles), max(1, int(self.config.get("image_tile_concurrency", 4))))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tile") as pool:
+            results = list(pool.map(run, tiles))
+        if cancel is not None and cancel.cancelled:
+            return ErrorText("翻译已取消")
+        result = self._stitch_tiles(tiles, results)
+        self._image_cache_put(image, target_lang, engine, result)
+        return result
+
+    def _stitch_tiles(self, tiles, results):
+        """拼接各横条的译文。带坐标的文本块按行中心归属到唯一的横条；
+        纯文本则去掉与上一条末尾重复的开头几行。"""
+        lines = []
+        records = []
+        for tile, result in zip(tiles, results):
+            if is_error(result):
+                return result
+            if isinstance(result, ImageTranslation):
+                records.extend(r.mapped(tile.scale, (0, tile.top)) for r in result.records
+                               if tile.owns(r.box[1], r.box[3]))
+                continue
+            current = [line for line in result.splitlines() if line.strip()]
+            lines.extend(current[_overlap_lines(lines, current):])
+        if records:
+            return ImageTranslation(records)
+        if not lines:
+            return ErrorText("图片中未识别到文字")
+        return "\n".join(lines)
+
+    def _image_cache_scope(self, target_lang, engine):
+        """图片结果缓存的区分字段：引擎 + 目标语言；AI 引擎额外包含接口和模型"""
+        extra = ()
+        if engine == "ai":
+            extra = (self.config.get("ai_endpoint", ""), self.config.get("ai_model", ""))
+        return (engine, target_lang) + extra
+
+    def _image_cache_get(self, image, target_lang, engine):
+        if self.image_cache is None or self._image_engine_spec(engine) is None:
+            return None
+        return self.image_cache.get(image, self._image_cache_scope(target_lang, engine))
+
+    def _image_cache_put(self, image, target_lang, engine, result):
+        """保存整图结果；带版面的结果同时按区域写入文本缓存，之后同样的文字不再请求"""
+        if self.image_cache is None or result is None or is_error(result):
+            return
+        self.image_cache.put(image, self._image_cache_scope(target_lang, engine), result)
+        if isinstance(result, ImageTranslation):
+            for record in result.records:
+                key = self._cache_key(record.source, target_lang, engine)
+                if key is not None and record.source.strip() and record.target:
+                    self.cache.put(key, record.target)
+
+    # ========== 流式翻译 ==========
+
+    def supports_stream(self, engine):
+        return engine == "ai" and self.config.get("ai_stream", True)
+
+    def translate_stream(self, text, target_lang="zh-CN", engine=None, cancel=None, timing=None):
+        """流式文本翻译，逐段产出译文增量。
+
+        AI 引擎走 SSE 流式接口，其它引擎（或命中缓存时）一次性产出完整结果。
+        失败时产出一个 ErrorText 并结束，调用方应以它替换已收到的内容。
+        timing 为 dict 时写入 ttft（首个增量耗时）和 total（总耗时），单位秒。
+        """
+        if engine is None:
+            engine = self.config.get("engine", "google")
+        if not text or not self.supports_stream(engine):
+            yield from self._timed_single(lambda: self.translate(text, target_lang, engine=engine, cancel=cancel), timing)
+            return
+        key = self._cache_key(text, target_lang, engine)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield from self._timed_single(lambda: cached, timing)
+                return
+        req = self._ai_text_request(text, target_lang)
+        if is_error(req):
+            yield req
+            return
+        result = yield from self._ai_stream(req, "AI", cancel, timing)
+        if key is not None and result is not None and not (cancel is not None and cancel.cancelled):
+            self.cache.put(key, result)
+
+    def translate_image_stream(self, image_bytes, target_lang="zh-CN", engine=None, cancel=None, timing=None):
+        """流式图片翻译，约定同 translate_stream"""
+        if engine is None:
+            engine = self.config.get("image_engine", "tencent")
+        if not image_bytes:
+            yield ErrorText("No image provided.")
+            return
+        image = as_encoded_image(image_bytes)
+        cached = self._image_cache_get(image, target_lang, engine)
+        if cached is not None:
+            yield from self._timed_single(lambda: cached, timing)
+            return
+        if self._image_layout(image, engine) is not None:
+            # 已知版面时按区域批量重翻，一次性输出
+            yield from self._timed_single(lambda: self.translate_image(image, target_lang, engine, cancel), timing)
+            return
+        tiles = self._image_tiles(image, engine)
+        if tiles:
+            # 分块请求并发执行，拼接后一次性输出
+            yield from self._timed_single(lambda: self._translate_tiled_image(image, tiles, target_lang, engine, cancel), timing)
+            return
+        data, info = self.prepare_image(image, engine)
+        if info is not None and timing is not None:
+            timing["image"] = info
+        if not self.supports_stream(engine):
+            yield from self._timed_single(lambda: self._translate_prepared_image(image, data, target_lang, engine, cancel, info), timing)
+            return
+        req = self._ai_image_request(data, target_lang, stream=True)
+        if is_error(req):
+            yield req
+            return
+        start = time.perf_counter()
+        result = yield from self._ai_stream(req, "AI 图片翻译", cancel, timing)
+        if info is not None:
+            PREPROCESS_STATS.record(info, time.perf_counter() - start)
+        if not (cancel is not None and cancel.cancelled):
+            self._image_cache_put(image, target_lang, engine, result)
+
+    def _timed_single(self, fn, timing):
+        start = time.perf_counter()
+        result = fn()
+        if timing is not None:
+            timing["ttft"] = timing["total"] = time.perf_counter() - start
+        yield result
+
+    def _ai_stream(self, req, label, cancel, timing):
+        """以 stream: true 调用 OpenAI 兼容接口，逐个产出 delta.content；成功时返回完整译文"""
+        if req.json is not None:
+            req.json = {**req.json, "stream": True}  # 图片请求体已预先序列化并带上 stream
+        start = time.perf_counter()
+        parts = []
+        with _bind_token(cancel):
+            try:
+                with self._send(req, stream=True) as res:
+                    if res.status_code != 200:
+                        yield ErrorText(f"{label} 错误 {res.status_code}: {res.text[:200]}")
+                        return None
+                    for line in res.iter_lines():
+                        if not line.startswith(b"data:"):
+                            continue  # 空行、注释和 event: 行
+                        payload = line[5:].strip()
+                        if payload == b"[DONE]":
+                            break
+                        choices = json.loads(payload).get("choices") or []
+                        delta = (choices[0].get("delta") or {}).get("content") if choices else None
+                        if not delta:
+                            continue
+                        if not parts:
+                            delta = delta.lstrip()
+                            if not delta:
+                                continue
+                            if timing is not None:
+                                timing["ttft"] = time.perf_counter() - start
+                        parts.append(delta)
+                        yield delta
+            except Exception as e:
+                if cancel is not None and cancel.cancelled:
+                    yield ErrorText("翻译已取消")
+                else:
+                    yield ErrorText(f"{label} 访问失败: {str(e)}")
+                return None
+        if timing is not None:
+            timing["total"] = time.perf_counter() - start
+            timing.setdefault("ttft", timing["total"])
+        if not parts:
+            yield ErrorText(f"{label} 返回内容为空")
+            return None
+        return "".join(parts).strip()
+
+    def _dispatch_image(self, image_bytes, target_lang, engine):
+        spec = self._image_engine_spec(engine)
+        if spec is None:
+            return ErrorText(f"引擎 {engine} 不支持图片翻译，请选择腾讯/AI")
         try:
-            if engine == "tencent":
-                return self._tencent_image_translate(image_bytes, target_lang)
-            elif engine == "ai":
-                return self._ai_image_translate(image_bytes, target_lang)
-            else:
-                return f"引擎 {engine} 不支持图片翻译，请选择腾讯/AI"
+            return self._execute(spec, image_bytes, target_lang)
         except Exception as e:
-            return f"图片翻译失败: {str(e)}"
+            return ErrorText(f"图片翻译失败: {str(e)}")
 
-    def _google_translate(self, text, target_lang="zh-CN"):
+    # ========== 请求执行 ==========
+    # 每个引擎拆成 "构造请求" 和 "解析响应" 两步，HTTP 收发由 _send 完成；
+    # 异步后端（async_translator.AsyncTranslator）复用同样的构造/解析逻辑。
+
+    def _text_engine_spec(self, engine):
+        """返回 (构造请求, 解析响应, 错误前缀)；未知引擎返回 None"""
+        specs = {
+            "google":    (self._google_request, self._google_parse, "Google 翻译失败"),
+            "deepl":     (self._deepl_request, self._deepl_parse, "DeepL 翻译失败"),
+            "tencent":   (self._tencent_request, self._tencent_parse, "腾讯翻译失败"),
+            "microsoft": (self._microsoft_request, self._microsoft_parse, "Microsoft 翻译失败"),
+            "volcano":   (self._volcano_request, self._volcano_parse, "火山翻译失败"),
+            "ai":        (self._ai_text_request, self._ai_parse, "AI 访问失败"),
+        }
+        return specs.get(engine)
+
+    def _batch_engine_spec(self, engine):
+        """支持一次请求翻译多段文本的引擎；解析结果为与输入等长的列表"""
+        specs = {
+            "deepl":     (self._deepl_batch_request, self._deepl_batch_parse, "DeepL 翻译失败"),
+            "tencent":   (self._tencent_batch_request, self._tencent_batch_parse, "腾讯翻译失败"),
+            "microsoft": (self._microsoft_batch_request, self._microsoft_batch_parse, "Microsoft 翻译失败"),
+            "volcano":   (self._volcano_batch_request, self._volcano_batch_parse, "火山翻译失败"),
+        }
+        return specs.get(engine)
+
+    def _image_engine_spec(self, engine):
+        specs = {
+            "tencent": (self._tencent_image_request, self._tencent_image_parse, "腾讯图片翻译失败"),
+            "ai":      (self._ai_image_request, self._ai_image_parse, "AI 图片翻译失败"),
+        }
+        return specs.get(engine)
+
+    def _execute(self, spec, payload, target_lang):
+        if spec is None:
+            return None
+        build, parse, label = spec
+        req = build(payload, target_lang)
+        if is_error(req):
+            return req
+        try:
+            return parse(self._send(req))
+        except Exception as e:
+            return ErrorText(f"{label}: {str(e)}")
+
+    def _resolve_url(self, url):
+        """按配置 endpoint_overrides（域名 -> 地址）改写请求地址，用于把引擎指向本地模拟服务"""
+        overrides = self.config.get("endpoint_overrides")
+        if not overrides:
+            return url
+        parts = urlsplit(url)
+        base = overrides.get(parts.netloc)
+        if base is None:
+            return url
+        return base.rstrip("/") + url[len(parts.scheme) + 3 + len(parts.netloc):]
+
+    def _send(self, req, **kwargs):
+        session = self._get_session(req.mode)
+        url = self._resolve_url(req.url)
+        self._touch(url)
+        return session.request(req.method, url, params=req.params, headers=req.headers,
+                               data=req.data, json=req.json, timeout=req.timeout, verify=False, **kwargs)
+
+    # ========== 连接预热与保活 ==========
+
+    def _touch(self, url):
+        now = time.monotonic()
+        parts = urlsplit(url)
+        self._last_used[f"{parts.scheme}://{parts.netloc}/"] = now
+        self.last_request = now
+
+    def warm_targets(self, engines, min_idle=0):
+        """engines 的请求会用到的 (源站, 代理模式)，跳过最近 min_idle 秒内用过的源站和未配置密钥的引擎"""
+        names = []
+        for engine in engines:
+            names.extend(self._race_engines() if engine in MULTI_ENGINE_MODES else [engine])
+        now = time.monotonic()
+        targets = set()
+        for engine in names:
+            spec = self._text_engine_spec(engine)  # 图片翻译与同一引擎的文本翻译是同一个域名
+            if spec is None:
+                continue
+            req = spec[0]("hello", "zh-CN")  # 只构造请求，取地址和代理模式
+            if is_error(req):
+                continue
+            parts = urlsplit(self._resolve_url(req.url))
+            origin = f"{parts.scheme}://{parts.netloc}/"
+            if now - self._last_used.get(origin, 0.0) >= min_idle:
+                targets.add((origin, req.mode))
+        return sorted(targets)
+
+    def warm_up(self, engines, min_idle=0):
+        """对 engines 用到的源站各发一个 HEAD 请求，提前完成 DNS、TCP、TLS（及代理 CONNECT），
+        连接留在连接池中供之后的翻译复用；返回预热的源站数"""
+        targets = self.warm_targets(engines, min_idle)
+        _active.warming = True
+        try:
+            for origin, mode in targets:
+                try:
+                    self._get_session(mode).head(origin, timeout=5, verify=False, allow_redirects=False)
+                    self._last_used[origin] = time.monotonic()
+                except Exception:
+                    pass  # 预热失败不影响正常翻译
+        finally:
+            _active.warming = False
+        return len(targets)
+
+    # ========== 文本翻译引擎 ==========
+
+    def _google_request(self, text, target_lang="zh-CN"):
         url = "https://translate.googleapis.com/translate_a/single"
         params = {"client": "gtx", "sl": "auto", "tl": target_lang, "dt": "t", "q": text}
-        
         mode = self.config.get("google_proxy_mode", "auto")
-        session = self._get_session(mode)
-        
-        try:
-            res = session.get(url, params=params, headers=self.headers, timeout=10, verify=False)
-            res.raise_for_status()
-            return "".join([x[0] for x in res.json()[0]])
-        except Exception as e:
-            return f"Google 翻译失败: {str(e)}"
+        return HttpRequest("GET", url, mode, params=params, headers=self.headers, timeout=10)
+
+    def _google_parse(self, res):
+        res.raise_for_status()
+        return "".join([x[0] for x in res.json()[0]])
+
+    def _deepl_request(self, text, target_lang="zh-CN"):
+        return self._deepl_batch_request([text], target_lang)
 
-    def _deepl_translate(self, text, target_lang="zh-CN"):
+    def _deepl_parse(self, res):
+        return _first(self._deepl_batch_parse(res))
+
+    def _deepl_batch_request(self, texts, target_lang="zh-CN"):
         api_key = self.config.get("deepl_api_key", "")
         if not api_key:
-            return "请在设置中配置 DeepL API Key"
+            return ErrorText("请在设置中配置 DeepL API Key")
         
         # DeepL 语言代码转换
         lang_map = {"zh-CN": "ZH", "en": "EN-US"}
@@ -97,93 +908,88 @@ class Translator:
         
         url = "https://api-free.deepl.com/v2/translate"
         headers = {"Authorization": f"DeepL-Auth-Key {api_key}"}
-        data = {"text": [text], "target_lang": target}
-        
+        data = {"text": list(texts), "target_lang": target}
         mode = self.config.get("deepl_proxy_mode", "auto")
-        session = self._get_session(mode)
-        
-        try:
-            res = session.post(url, headers=headers, data=data, timeout=10, verify=False)
-            res.raise_for_status()
-            return res.json()["translations"][0]["text"]
-        except Exception as e:
-            return f"DeepL 翻译失败: {str(e)}"
+        return HttpRequest("POST", url, mode, headers=headers, data=data, timeout=10)
+
+    def _deepl_batch_parse(self, res):
+        res.raise_for_status()
+        return [item["text"] for item in res.json()["translations"]]
 
-    def _tencent_translate(self, text, target_lang="zh-CN"):
+    def _tencent_request(self, text, target_lang="zh-CN"):
         secret_id = self.config.get("tencent_secret_id", "")
         secret_key = self.config.get("tencent_secret_key", "")
         
         if not secret_id or not secret_key:
-            return "请在设置中配置腾讯云 SecretId 和 SecretKey"
+            return ErrorText("请在设置中配置腾讯云 SecretId 和 SecretKey")
         
         # 腾讯云语言代码
         lang_map = {"zh-CN": "zh", "en": "en"}
         target = lang_map.get(target_lang, "zh")
         
-        endpoint = "tmt.tencentcloudapi.com"
-        service = "tmt"
-        action = "TextTranslate"
-        version = "2018-03-21"
-        region = self.config.get("tencent_region", "ap-beijing")
-        timestamp = int(time.time())
-        
         payload = {
             "SourceText": text,
             "Source": "auto",
             "Target": target,
             "ProjectId": 0
         }
+        return self._tencent_signed_request("TextTranslate", json.dumps(payload), 10)
+
+    def _tencent_batch_request(self, texts, target_lang="zh-CN"):
+        secret_id = self.config.get("tencent_secret_id", "")
+        secret_key = self.config.get("tencent_secret_key", "")
         
-        # 腾讯云签名
-        canonical_headers = f"content-type:application/json\nhost:{endpoint}\n"
-        signed_headers = "content-type;host"
-        payload_str = json.dumps(payload)
-        canonical_request = f"POST\n/\n\n{canonical_headers}\n{signed_headers}\n{hashlib.sha256(payload_str.encode()).hexdigest()}"
-        
-        date = datetime.utcfromtimestamp(timestamp).strftime("%Y-%m-%d")
-        credential_scope = f"{date}/{service}/tc3_request"
-        string_to_sign = f"TC3-HMAC-SHA256\n{timestamp}\n{credential_scope}\n{hashlib.sha256(canonical_request.encode()).hexdigest()}"
-        
-        def sign(key, msg):
-            return hmac.new(key, msg.encode() if isinstance(msg, str) else msg, hashlib.sha256).digest()
-        
-        secret_date = sign(("TC3" + secret_key).encode(), date)
-        secret_service = sign(secret_date, service)
-        secret_signing = sign(secret_service, "tc3_request")
-        signature = hmac.new(secret_signing, string_to_sign.encode(), hashlib.sha256).hexdigest()
-        
-        authorization = f"TC3-HMAC-SHA256 Credential={secret_id}/{credential_scope}, SignedHeaders={signed_headers}, Signature={signature}"
+        if not secret_id or not secret_key:
+            return ErrorText("请在设置中配置腾讯云 SecretId 和 SecretKey")
         
-        headers = {
-            "Authorization": authorization,
-            "Content-Type": "application/json",
-            "Host": endpoint,
-            "X-TC-Action": action,
-            "X-TC-Timestamp": str(timestamp),
-            "X-TC-Version": version,
-            "X-TC-Region": region
+        lang_map = {"zh-CN": "zh", "en": "en"}
+        payload = {
+            "SourceTextList": list(texts),
+            "Source": "auto",
+            "Target": lang_map.get(target_lang, "zh"),
+            "ProjectId": 0
         }
-        
+        return self._tencent_signed_request("TextTranslateBatch", json.dumps(payload), 10)
+
+    def _tencent_batch_parse(self, res):
+        res.raise_for_status()
+        result = res.json()
+        if "Response" in result and "TargetTextList" in result["Response"]:
+            return result["Response"]["TargetTextList"]
+        else:
+            return ErrorText(f"腾讯翻译失败: {result.get('Response', {}).get('Error', {}).get('Message', '未知错误')}")
+
+    def _tencent_signed_request(self, action, body, timeout, payload_hash=None):
+        """构造带 TC3-HMAC-SHA256 签名的腾讯云机器翻译请求；body 为 JSON 字符串或已编码的字节"""
+        endpoint = "tmt.tencentcloudapi.com"
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        headers = tc3_headers(self.config.get("tencent_secret_id", ""), self.config.get("tencent_secret_key", ""),
+                              endpoint, "tmt", "2018-03-21", self.config.get("tencent_region", "ap-beijing"),
+                              action, body, payload_hash=payload_hash)
         mode = self.config.get("tencent_proxy_mode", "direct")
-        session = self._get_session(mode)
-        
-        try:
-            res = session.post(f"https://{endpoint}", headers=headers, data=payload_str, timeout=10, verify=False)
-            res.raise_for_status()
-            result = res.json()
-            if "Response" in result and "TargetText" in result["Response"]:
-                return result["Response"]["TargetText"]
-            else:
-                return f"腾讯翻译失败: {result.get('Response', {}).get('Error', {}).get('Message', '未知错误')}"
-        except Exception as e:
-            return f"腾讯翻译失败: {str(e)}"
+        return HttpRequest("POST", f"https://{endpoint}", mode, headers=headers, data=body, timeout=timeout)
+
+    def _tencent_parse(self, res):
+        res.raise_for_status()
+        result = res.json()
+        if "Response" in result and "TargetText" in result["Response"]:
+            return result["Response"]["TargetText"]
+        else:
+            return ErrorText(f"腾讯翻译失败: {result.get('Response', {}).get('Error', {}).get('Message', '未知错误')}")
 
-    def _microsoft_translate(self, text, target_lang="zh-CN"):
+    def _microsoft_request(self, text, target_lang="zh-CN"):
+        return self._microsoft_batch_request([text], target_lang)
+
+    def _microsoft_parse(self, res):
+        return _first(self._microsoft_batch_parse(res))
+
+    def _microsoft_batch_request(self, texts, target_lang="zh-CN"):
         api_key = self.config.get("microsoft_api_key", "")
         region = self.config.get("microsoft_region", "eastasia")
         
         if not api_key:
-            return "请在设置中配置 Microsoft API Key"
+            return ErrorText("请在设置中配置 Microsoft API Key")
         
         # 微软语言代码
         lang_map = {"zh-CN": "zh-Hans", "en": "en"}
@@ -195,106 +1001,64 @@ class Translator:
             "Ocp-Apim-Subscription-Region": region,
             "Content-Type": "application/json"
         }
-        body = [{"text": text}]
-        
+        body = [{"text": text} for text in texts]
         mode = self.config.get("microsoft_proxy_mode", "direct")
-        session = self._get_session(mode)
-        
-        try:
-            res = session.post(url, headers=headers, json=body, timeout=10, verify=False)
-            res.raise_for_status()
-            return res.json()[0]["translations"][0]["text"]
-        except Exception as e:
-            return f"Microsoft 翻译失败: {str(e)}"
+        return HttpRequest("POST", url, mode, headers=headers, json=body, timeout=10)
+
+    def _microsoft_batch_parse(self, res):
+        res.raise_for_status()
+        return [item["translations"][0]["text"] for item in res.json()]
 
-    def _volcano_translate(self, text, target_lang="zh-CN"):
+    def _volcano_request(self, text, target_lang="zh-CN"):
+        return self._volcano_batch_request([text], target_lang)
+
+    def _volcano_parse(self, res):
+        return _first(self._volcano_batch_parse(res))
+
+    def _volcano_batch_request(self, texts, target_lang="zh-CN"):
         access_key = self.config.get("volcano_access_key", "").strip()
         secret_key = self.config.get("volcano_secret_key", "").strip()
         
         if not access_key or not secret_key:
-            return "请在设置中配置火山引擎 AccessKey 和 SecretKey"
+            return ErrorText("请在设置中配置火山引擎 AccessKey 和 SecretKey")
         
         # 火山引擎语言代码
         lang_map = {"zh-CN": "zh", "en": "en"}
         target = lang_map.get(target_lang, "zh")
         
-        service = "translate"
-        version = "2020-06-01"
-        action = "TranslateText"
         region = self.config.get("volcano_region", "cn-north-1").strip()
         host = "open.volcengineapi.com"
+        query = "Action=TranslateText&Version=2020-06-01"
         
         # 构建请求体
         body = {
             "TargetLanguage": target,
-            "TextList": [text]
-        }
-        body_json = json.dumps(body)
-        
-        # 火山引擎签名 v4
-        timestamp = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
-        date = timestamp[:8]
-        
-        # 构建 Canonical Request - 使用字符串拼接避免格式化问题
-        canonical_uri = "/"
-        canonical_querystring = "Action=" + action + "&Version=" + version
-        canonical_headers = "content-type:application/json\nhost:" + host + "\nx-date:" + timestamp + "\n"
-        signed_headers = "content-type;host;x-date"
-        payload_hash = hashlib.sha256(body_json.encode()).hexdigest()
-        canonical_request = "POST\n" + canonical_uri + "\n" + canonical_querystring + "\n" + canonical_headers + "\n" + signed_headers + "\n" + payload_hash
-        
-        # 构建 String to Sign
-        credential_scope = date + "/" + region + "/" + service + "/request"
-        hashed_canonical_request = hashlib.sha256(canonical_request.encode()).hexdigest()
-        string_to_sign = "HMAC-SHA256\n" + timestamp + "\n" + credential_scope + "\n" + hashed_canonical_request
-        
-        # 计算签名
-        def sign(key, msg):
-            return hmac.new(key, msg.encode() if isinstance(msg, str) else msg, hashlib.sha256).digest()
-        
-        k_date = sign(secret_key.encode(), date)
-        k_region = sign(k_date, region)
-        k_service = sign(k_region, service)
-        k_signing = sign(k_service, "request")
-        signature = hmac.new(k_signing, string_to_sign.encode(), hashlib.sha256).hexdigest()
-        
-        # 构建 Authorization Header - 使用字符串拼接避免任何格式化问题
-        authorization = "HMAC-SHA256 Credential=" + access_key + "/" + credential_scope + ", SignedHeaders=" + signed_headers + ", Signature=" + signature
-        
-        headers = {
-            "Content-Type": "application/json",
-            "Host": host,
-            "X-Date": timestamp,
-            "Authorization": authorization
+            "TextList": list(texts)
         }
-        
+        body_json = json.dumps(body).encode("utf-8")
+        headers = volcano_headers(access_key, secret_key, host, "translate", region, query, body_json)
         mode = self.config.get("volcano_proxy_mode", "direct")
-        session = self._get_session(mode)
+        return HttpRequest("POST", f"https://{host}/?{query}", mode, headers=headers, data=body_json, timeout=10)
+
+    def _volcano_batch_parse(self, res):
+        if res.status_code >= 400:
+            return ErrorText("火山翻译 HTTP 错误: " + str(res.status_code) + " - " + res.text[:200])
+        result = res.json()
         
-        try:
-            url = "https://" + host + "/?" + canonical_querystring
-            res = session.post(url, headers=headers, data=body_json, timeout=10, verify=False)
-            res.raise_for_status()
-            result = res.json()
-            
-            # 检查是否有错误
-            if "ResponseMetadata" in result and "Error" in result["ResponseMetadata"]:
-                error_info = result["ResponseMetadata"]["Error"]
-                error_code = error_info.get("Code", "Unknown")
-                error_msg = error_info.get("Message", "未知错误")
-                return "火山翻译失败 [" + error_code + "]: " + error_msg
-            
-            # 提取翻译结果
-            if "TranslationList" in result and len(result["TranslationList"]) > 0:
-                return result["TranslationList"][0]["Translation"]
-            else:
-                return "火山翻译失败: 返回结果格式异常 - " + json.dumps(result, ensure_ascii=False)[:200]
-        except requests.exceptions.HTTPError as e:
-            return "火山翻译 HTTP 错误: " + str(e.response.status_code) + " - " + e.response.text[:200]
-        except Exception as e:
-            return "火山翻译失败: " + str(e)
+        # 检查是否有错误
+        if "ResponseMetadata" in result and "Error" in result["ResponseMetadata"]:
+            error_info = result["ResponseMetadata"]["Error"]
+            error_code = error_info.get("Code", "Unknown")
+            error_msg = error_info.get("Message", "未知错误")
+            return ErrorText("火山翻译失败 [" + error_code + "]: " + error_msg)
+        
+        # 提取翻译结果
+        if "TranslationList" in result and len(result["TranslationList"]) > 0:
+            return [item["Translation"] for item in result["TranslationList"]]
+        else:
+            return ErrorText("火山翻译失败: 返回结果格式异常 - " + json.dumps(result, ensure_ascii=False)[:200])
 
-    def _ai_translate(self, text, target_lang="zh-CN"):
+    def _ai_text_request(self, text, target_lang="zh-CN"):
         key = self.config.get("ai_api_key")
         base_url = self.config.get("ai_endpoint", "").rstrip('/')
         model = self.config.get("ai_model", "gpt-3.5-turbo")
@@ -306,111 +1070,62 @@ class Translator:
         else:
             lang_instruction = "Translate the following text to English"
 
-        if not key: return "Please set AI API Key."
+        if not key: return ErrorText("Please set AI API Key.")
         api_url = base_url if "/chat/completions" in base_url else f"{base_url}/chat/completions"
 
         headers = {"Authorization": f"Bearer {key}", "Content-Type": "application/json"}
         data = {"model": model, "messages": [{"role": "system", "content": f"{lang_instruction}: {prompt}"}, {"role": "user", "content": text}]}
-        
         mode = self.config.get("ai_proxy_mode", "direct")
-        session = self._get_session(mode)
-        
-        try:
-            res = session.post(api_url, headers=headers, json=data, timeout=30, verify=False)
-            if res.status_code != 200:
-                return f"AI Error {res.status_code}: {res.text[:200]}"
-            return res.json()['choices'][0]['message']['content'].strip()
-        except Exception as e:
-            return f"AI 访问失败: {str(e)}"
+        return HttpRequest("POST", api_url, mode, headers=headers, json=data, timeout=30)
+
+    def _ai_parse(self, res):
+        if res.status_code != 200:
+            return ErrorText(f"AI Error {res.status_code}: {res.text[:200]}")
+        return res.json()['choices'][0]['message']['content'].strip()
     
-    # ========== 图片翻译方法 ==========
+    # ========== 图片翻译引擎 ==========
     
-    def _tencent_image_translate(self, image_bytes, target_lang="zh-CN"):
+    def _tencent_image_request(self, image_bytes, target_lang="zh-CN"):
         """腾讯云图片翻译"""
         secret_id = self.config.get("tencent_secret_id", "")
         secret_key = self.config.get("tencent_secret_key", "")
         
         if not secret_id or not secret_key:
-            return "请在设置中配置腾讯云 SecretId 和 SecretKey"
+            return ErrorText("请在设置中配置腾讯云 SecretId 和 SecretKey")
         
         # 腾讯云语言代码
         lang_map = {"zh-CN": "zh", "en": "en"}
         target = lang_map.get(target_lang, "zh")
         
-        endpoint = "tmt.tencentcloudapi.com"
-        service = "tmt"
-        action = "ImageTranslate"
-        version = "2018-03-21"
-        region = self.config.get("tencent_region", "ap-beijing")
-        timestamp = int(time.time())
-        
-        # 将��片转为 base64
-        image_base64 = base64.b64encode(image_bytes).decode('utf-8')
-        
         payload = {
             "SessionUuid": str(int(time.time() * 1000)),
             "Scene": "doc",
-            "Data": image_base64,
+            "Data": _BASE64_SLOT,
             "Source": "auto",
             "Target": target,
             "ProjectId": 0
         }
-        
-        # 腾讯云签名
-        canonical_headers = f"content-type:application/json\nhost:{endpoint}\n"
-        signed_headers = "content-type;host"
-        payload_str = json.dumps(payload)
-        canonical_request = f"POST\n/\n\n{canonical_headers}\n{signed_headers}\n{hashlib.sha256(payload_str.encode()).hexdigest()}"
-        
-        date = datetime.utcfromtimestamp(timestamp).strftime("%Y-%m-%d")
-        credential_scope = f"{date}/{service}/tc3_request"
-        string_to_sign = f"TC3-HMAC-SHA256\n{timestamp}\n{credential_scope}\n{hashlib.sha256(canonical_request.encode()).hexdigest()}"
-        
-        def sign(key, msg):
-            return hmac.new(key, msg.encode() if isinstance(msg, str) else msg, hashlib.sha256).digest()
-        
-        secret_date = sign(("TC3" + secret_key).encode(), date)
-        secret_service = sign(secret_date, service)
-        secret_signing = sign(secret_service, "tc3_request")
-        signature = hmac.new(secret_signing, string_to_sign.encode(), hashlib.sha256).hexdigest()
-        
-        authorization = f"TC3-HMAC-SHA256 Credential={secret_id}/{credential_scope}, SignedHeaders={signed_headers}, Signature={signature}"
-        
-        headers = {
-            "Authorization": authorization,
-            "Content-Type": "application/json",
-            "Host": endpoint,
-            "X-TC-Action": action,
-            "X-TC-Timestamp": str(timestamp),
-            "X-TC-Version": version,
-            "X-TC-Region": region
-        }
-        
-        mode = self.config.get("tencent_proxy_mode", "direct")
-        session = self._get_session(mode)
-        
-        try:
-            res = session.post(f"https://{endpoint}", headers=headers, data=payload_str, timeout=30, verify=False)
-            res.raise_for_status()
-            result = res.json()
-            if "Response" in result and "ImageRecord" in result["Response"]:
-                # 提取所有文本块
-                records = result["Response"]["ImageRecord"]["Value"]
-                translated_texts = [item["TargetText"] for item in records]
-                return "\n".join(translated_texts)
-            else:
-                return f"腾讯图片翻译失败: {result.get('Response', {}).get('Error', {}).get('Message', '未知错误')}"
-        except Exception as e:
-            return f"腾讯图片翻译失败: {str(e)}"
+        body, payload_hash = _json_with_base64(payload, image_bytes)
+        return self._tencent_signed_request("ImageTranslate", body, 30, payload_hash=payload_hash)
+
+    def _tencent_image_parse(self, res):
+        """返回 ImageTranslation：按行拼接的译文，records 保留各文本块的原文、坐标和置信度"""
+        res.raise_for_status()
+        result = res.json()
+        if "Response" in result and "ImageRecord" in result["Response"]:
+            return ImageTranslation([ImageRecord.from_tencent(item)
+                                     for item in result["Response"]["ImageRecord"]["Value"]])
+        else:
+            return ErrorText(f"腾讯图片翻译失败: {result.get('Response', {}).get('Error', {}).get('Message', '未知错误')}")
     
-    def _ai_image_translate(self, image_bytes, target_lang="zh-CN"):
+    def _ai_image_request(self, image_bytes, target_lang="zh-CN", stream=False):
         """AI 大模型图片翻译（支持 GPT-4V 等视觉模型）"""
         key = self.config.get("ai_api_key")
         base_url = self.config.get("ai_endpoint", "").rstrip('/')
         model = self.config.get("ai_model", "gpt-4-vision-preview")
         
         if not key:
-            return "请在设置中配置 AI API Key"
+            return ErrorText("请在设置中配置 AI API Key")
         
         # 根据目标语言调整提示词
         if target_lang == "zh-CN":
@@ -420,9 +1135,6 @@ class Translator:
         
         api_url = base_url if "/chat/completions" in base_url else f"{base_url}/chat/completions"
         
-        # 将图片转为 base64
-        image_base64 = base64.b64encode(image_bytes).decode('utf-8')
-        
         headers = {"Authorization": f"Bearer {key}", "Content-Type": "application/json"}
         data = {
             "model": model,
@@ -431,20 +1143,19 @@ class Translator:
                     "role": "user",
                     "content": [
                         {"type": "text", "text": lang_instruction},
-                        {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{image_base64}"}}
+                        {"type": "image_url", "image_url": {"url": f"data:{image_mime(image_bytes)};base64,{_BASE64_SLOT}"}}
                     ]
                 }
             ],
-            "max_tokens": 1000
+            "max_tokens": self.config.get("ai_image_max_tokens", 4096)
         }
-        
+        if stream:
+            data["stream"] = True
+        body, _ = _json_with_base64(data, image_bytes)
         mode = self.config.get("ai_proxy_mode", "direct")
-        session = self._get_session(mode)
-        
-        try:
-            res = session.post(api_url, headers=headers, json=data, timeout=60, verify=False)
-            if res.status_code != 200:
-                return f"AI 图片翻译错误 {res.status_code}: {res.text[:200]}"
-            return res.json()['choices'][0]['message']['content'].strip()
-        except Exception as e:
-            return f"AI 图片翻译失败: {str(e)}"
+        return HttpRequest("POST", api_url, mode, headers=headers, data=body, timeout=60)
+
+    def _ai_image_parse(self, res):
+        if res.status_code != 200:
+            return ErrorText(f"AI 图片翻译错误 {res.status_code}: {res.text[:200]}")
+        return res.json()['choices'][0]['message']['content'].strip()
@@ -2,9 +2,10 @@ from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QPushButton, QLabel,
                              QTextEdit, QLineEdit, QComboBox, QFormLayout,
                              QTabWidget, QApplication, QHBoxLayout, QCheckBox,
                              QFileDialog, QGraphicsDropShadowEffect, QGroupBox,
-                             QSpacerItem, QSizePolicy)
-from PyQt5.QtCore import Qt, QPoint, pyqtSignal as Signal, QTimer, QEvent
-from PyQt5.QtGui import QIcon, QCursor, QPixmap, QColor, QFont
+                             QSpacerItem, QSizePolicy, QListView, QAbstractItemView,
+                             QStyledItemDelegate, QStyle)
+from PyQt5.QtCore import Qt, QPoint, pyqtSignal as Signal, QTimer, QEvent, QAbstractListModel, QModelIndex, QRect, QSize
+from PyQt5.QtGui import QIcon, QCursor, QPixmap, QColor, QFont, QTextCursor, QFontMetrics, QPainter
 
 # ── 引擎名称映射 ──
 ENGINE_NAMES = {
@@ -14,6 +15,8 @@ ENGINE_NAMES = {
     "tencent":   "腾讯翻译",
     "volcano":   "火山翻译",
     "ai":        "AI 大模型",
+    "race":      "多引擎竞速",
+    "hedge":     "多引擎对冲",
 }
 ENGINE_KEYS = list(ENGINE_NAMES.keys())
 
@@ -132,6 +135,7 @@ class ResultPopup(QWidget):
         self.source_text = ""   # 保存原文，用于切换引擎/语言时重翻
         self.is_image = False   # 标记是否为图片翻译
         self.pinned = False     # 钉住状态：True时点击外部不隐藏
+        self.status_text = ""   # 底部状态栏文字（耗时等）
 
         self.dragging = False
         self.resizing = False
@@ -269,9 +273,13 @@ class ResultPopup(QWidget):
         copy_btn.setStyleSheet(_btn_style(dk, accent=True))
         copy_btn.clicked.connect(self.copy_to_clipboard)
 
+        self.status_label = QLabel(self.status_text)
+        self.status_label.setStyleSheet(f"color:{'#888' if dk else '#999'};font-size:{sp(11)}px;")
+
         barL.addWidget(retranslate_btn)
         barL.addWidget(history_btn)
         barL.addStretch()
+        barL.addWidget(self.status_label)
         barL.addWidget(copy_btn)
         bl.addWidget(bar)
 
@@ -341,9 +349,18 @@ class ResultPopup(QWidget):
         self.show()
         self.activateWindow()
 
-    def update_result(self, text):
-        """重翻完成后更新内容"""
-        self.content.setText(text)
+    def update_result(self, text, append=False):
+        """重翻完成后更新内容；append=True 时追加到末尾，用于流式逐段显示"""
+        if append:
+            self.content.moveCursor(QTextCursor.End)
+            self.content.insertPlainText(text)
+        else:
+            self.content.setText(text)
+
+    def set_status(self, text):
+        """在底部状态栏显示耗时等信息"""
+        self.status_text = text
+        self.status_label.setText(text)
 
     # ── 窗口拖动 / 缩放 ──
     def resizeEvent(self, event):
@@ -498,13 +515,41 @@ class SettingsWindow(QWidget):
         self.proxy_url = QLineEdit(c.get('proxy_url', 'http://127.0.0.1:7897'))
         self.proxy_url.setPlaceholderText("http://127.0.0.1:7897")
 
+        # 竞速/对冲模式使用的引擎（按优先级排列）
+        self.race_engines = QLineEdit(", ".join(c.get('race_engines', ["google", "microsoft", "volcano"])))
+        self.race_engines.setPlaceholderText("google, microsoft, volcano")
+
+        # 网络后端：requests 同步请求 / asyncio 异步连接池（需安装 httpx）
+        self.backend_combo = QComboBox()
+        self.backend_combo.addItems(["requests", "async"])
+        self.backend_combo.setCurrentText(c.get('engine_backend', 'requests'))
+
+        self.server_enabled = QCheckBox(f"启用本地翻译服务（http://127.0.0.1:{c.get('server_port', 8765)}）")
+        self.server_enabled.setChecked(c.get('server_enabled', False))
+
+        self.speculative = QCheckBox("划词后提前翻译（点击图标即显示结果，收费引擎按每日额度限制）")
+        self.speculative.setChecked(c.get('speculative_translation', False))
+
+        # 预取：显示结果后在后台翻译另一种语言和备选引擎，弹窗中切换时立即显示
+        self.prefetch = QCheckBox("显示结果后预取另一种语言和备选引擎的译文")
+        self.prefetch.setChecked(c.get('prefetch_alternates', False))
+        self.prefetch_engine_combo = QComboBox()
+        self.prefetch_engine_combo.addItems([""] + [k for k in ENGINE_KEYS if k not in ("race", "hedge")])
+        self.prefetch_engine_combo.setCurrentText(c.get('prefetch_engine', ''))
+
         # 历史记录数量设置
         self.history_max_combo = QComboBox()
-        self.history_max_combo.addItems(["5", "10", "20", "30", "50"])
+        self.history_max_combo.addItems(["5", "10", "20", "30", "50", "100", "1000", "10000", "100000"])
         current_max = str(c.get('history_max_count', 10))
         idx = self.history_max_combo.findText(current_max)
         self.history_max_combo.setCurrentIndex(idx if idx >= 0 else 1)
 
+        # 历史记录存储：jsonl 文件 / sqlite 数据库（全文搜索，适合保留大量记录）
+        self.history_backend_combo = QComboBox()
+        self.history_backend_combo.addItems(["jsonl", "sqlite"])
+        self.history_backend_combo.setCurrentText(c.get('history_backend', 'jsonl'))
+        self.history_backend_combo.setToolTip("保留数量超过 1000 条时总是使用 sqlite")
+
         icon_row = QHBoxLayout()
         self.icon_path_display = QLineEdit(c.get('custom_icon_path', ''))
         self.icon_path_display.setPlaceholderText("使用默认图标")
@@ -514,14 +559,22 @@ class SettingsWindow(QWidget):
         icon_row.addWidget(btn_browse)
 
         f.addRow(self.auto_start)
+        f.addRow(self.server_enabled)
+        f.addRow(self.speculative)
+        f.addRow(self.prefetch)
         f.addRow("默认翻译引擎:", self.engine_combo)
         f.addRow("图片翻译引擎:", self.image_engine_combo)
+        f.addRow("预取备选引擎:", self.prefetch_engine_combo)
         f.addRow("代理服务器地址:", self.proxy_url)
+        f.addRow("竞速/对冲引擎:", self.race_engines)
+        f.addRow("网络后端:", self.backend_combo)
         f.addRow("历史记录保留数量:", self.history_max_combo)
+        f.addRow("历史记录存储:", self.history_backend_combo)
         f.addRow("自定义悬浮图标:", icon_row)
         tip = QLabel("<font color='gray'>提示：代理地址用于 manual 模式，确保端口与 Clash 等代理工具一致。<br>"
                      "各引擎的代理模式请在各自的 Tab 中设置。<br>"
-                     "图片翻译仅支持腾讯/火山/AI 引擎。</font>")
+                     "图片翻译仅支持腾讯/火山/AI 引擎。<br>"
+                     "竞速模式同时请求多个引擎并采用最先返回的结果；对冲模式在首个引擎较慢时才请求下一个。</font>")
         tip.setWordWrap(True)
         f.addRow(tip)
         return w
@@ -614,11 +667,14 @@ class SettingsWindow(QWidget):
         self.ai_prompt.setMaximumHeight(100)
         self.ai_proxy = _proxy_combo()
         self.ai_proxy.setCurrentText(c.get('ai_proxy_mode', 'direct'))
+        self.ai_stream = QCheckBox("流式输出（边生成边显示）")
+        self.ai_stream.setChecked(c.get('ai_stream', True))
         f.addRow("API Key:", self.ai_key)
         f.addRow("Endpoint:", self.ai_endpoint)
         f.addRow("Model:", self.ai_model)
         f.addRow("Prompt:", self.ai_prompt)
         f.addRow("代理模式:", self.ai_proxy)
+        f.addRow(self.ai_stream)
         f.addRow(QLabel("<font color='gray'>支持 OpenAI 及所有兼容 API（DeepSeek、Kimi 等）。<br>"
                         "只需修改 Endpoint 和 Model 即可。</font>"))
         return w
@@ -633,6 +689,12 @@ class SettingsWindow(QWidget):
             "image_engine":       self.image_engine_combo.currentText(),
             "auto_start":         self.auto_start.isChecked(),
             "proxy_url":          self.proxy_url.text(),
+            "race_engines":       [e.strip() for e in self.race_engines.text().split(",") if e.strip() in ENGINE_KEYS],
+            "engine_backend":     self.backend_combo.currentText(),
+            "server_enabled":     self.server_enabled.isChecked(),
+            "speculative_translation": self.speculative.isChecked(),
+            "prefetch_alternates": self.prefetch.isChecked(),
+            "prefetch_engine":    self.prefetch_engine_combo.currentText(),
             "custom_icon_path":   self.icon_path_display.text(),
             "google_proxy_mode":  self.g_proxy_mode.currentText(),
             "deepl_api_key":      self.deepl_key.text(),
@@ -653,7 +715,9 @@ class SettingsWindow(QWidget):
             "ai_model":           self.ai_model.text(),
             "ai_prompt":          self.ai_prompt.toPlainText(),
             "ai_proxy_mode":      self.ai_proxy.currentText(),
+            "ai_stream":          self.ai_stream.isChecked(),
             "history_max_count":  int(self.history_max_combo.currentText()),
+            "history_backend":    self.history_backend_combo.currentText(),
         }
         self.config_saved.emit(new_config)
         self.hide()
@@ -666,7 +730,7 @@ def _history_style():
     fs = sp(13)
     return f"""
     QWidget {{ font-size: {fs}px; }}
-    QScrollArea {{ border: none; background: #f8f9fa; }}
+    QListView {{ border: none; background: #f8f9fa; }}
     QPushButton#clear_btn {{
         background: #e74c3c; color: white; border: none;
         border-radius: 6px; padding: 6px 16px; font-size: {fs}px;
@@ -674,6 +738,150 @@ def _history_style():
     QPushButton#clear_btn:hover {{ background: #c0392b; }}
 """
 
+class HistoryModel(QAbstractListModel):
+    """历史记录列表模型：按搜索条件分页从历史存储读取，滚动到底部时再取下一页"""
+    PAGE_SIZE = 100
+    RecordRole = Qt.UserRole + 1
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._records = []
+        self._text = ""
+        self.total = 0
+
+    def reset(self, text=""):
+        """按搜索文字重新查询，只读取第一页"""
+        from config_manager import search_history, count_history
+        self.beginResetModel()
+        self._text = text
+        self.total = count_history(text)
+        self._records = search_history(text, limit=self.PAGE_SIZE) if self.total else []
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._records)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._records):
+            return None
+        record = self._records[index.row()]
+        if role == self.RecordRole:
+            return record
+        if role == Qt.DisplayRole:
+            return record.get("result", "")
+        if role == Qt.ToolTipRole:
+            source = record.get("source", "")
+            return source[:500] if source != "[图片翻译]" else None
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and len(self._records) < self.total
+
+    def fetchMore(self, parent=QModelIndex()):
+        from config_manager import search_history
+        page = search_history(self._text, limit=self.PAGE_SIZE, offset=len(self._records))
+        if not page:
+            self.total = len(self._records)  # 读取期间记录被删除
+            return
+        start = len(self._records)
+        self.beginInsertRows(QModelIndex(), start, start + len(page) - 1)
+        self._records.extend(page)
+        self.endInsertRows()
+
+class HistoryDelegate(QStyledItemDelegate):
+    """把一条记录绘制成卡片：时间/引擎/语言、原文一行、译文两行和"复制译文"按钮。
+    各行高度相同，列表只绘制可见的行，不为每条记录创建控件。"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.meta_font = QFont()
+        self.meta_font.setPixelSize(sp(11))
+        self.source_font = QFont()
+        self.source_font.setPixelSize(sp(12))
+        self.result_font = QFont()
+        self.result_font.setPixelSize(sp(13))
+        self.margin = sp(12)
+        self.button_size = (sp(72), sp(24))
+
+    def sizeHint(self, option, index):
+        lines = (QFontMetrics(self.meta_font).height() + QFontMetrics(self.source_font).height()
+                 + 2 * QFontMetrics(self.result_font).height())
+        return QSize(option.rect.width(), lines + self.button_size[1] + 2 * self.margin + sp(8))
+
+    def _card_rect(self, option):
+        return QRect(option.rect).adjusted(0, sp(4), -sp(4), -sp(4))
+
+    def _button_rect(self, option):
+        card = self._card_rect(option)
+        w, h = self.button_size
+        return QRect(card.right() - self.margin - w, card.bottom() - sp(8) - h, w, h)
+
+    def paint(self, painter, option, index):
+        record = index.data(HistoryModel.RecordRole)
+        if record is None:
+            return
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        card = self._card_rect(option)
+        hovered = bool(option.state & QStyle.State_MouseOver)
+        painter.setPen(QColor("#667eea" if hovered else "#e0e0e0"))
+        painter.setBrush(QColor("white"))
+        painter.drawRoundedRect(card, sp(10), sp(10))
+
+        x, width = card.left() + self.margin, card.width() - 2 * self.margin
+        y = card.top() + sp(10)
+
+        # 时间 + 引擎 + 语言
+        engine = record.get("engine", "")
+        lang = "中文" if record.get("target_lang") == "zh-CN" else "English"
+        painter.setFont(self.meta_font)
+        painter.setPen(QColor("#888"))
+        h = QFontMetrics(self.meta_font).height()
+        painter.drawText(QRect(x, y, width, h), Qt.AlignLeft | Qt.AlignVCenter,
+                         f"{record.get('time', '')}    {ENGINE_NAMES.get(engine, engine)}  →  {lang}")
+        y += h
+
+        # 原文（单行，超出部分省略）
+        source = record.get("source", "")
+        font = QFont(self.source_font)
+        font.setItalic(source == "[图片翻译]")
+        metrics = QFontMetrics(font)
+        painter.setFont(font)
+        painter.setPen(QColor("#888" if source == "[图片翻译]" else "#555"))
+        text = "原文: " + " ".join(source[:300].split())
+        painter.drawText(QRect(x, y, width, metrics.height()), Qt.AlignLeft | Qt.AlignVCenter,
+                         metrics.elidedText(text, Qt.ElideRight, width))
+        y += metrics.height()
+
+        # 译文（最多两行）
+        metrics = QFontMetrics(self.result_font)
+        painter.setFont(self.result_font)
+        painter.setPen(QColor("#2c3e50"))
+        text = "译文: " + " ".join(record.get("result", "")[:400].split())
+        # 按两行的宽度省略后逐字换行，超出两行的部分被裁掉
+        text = metrics.elidedText(text, Qt.ElideRight, 2 * width - 2 * metrics.averageCharWidth())
+        painter.drawText(QRect(x, y, width, 2 * metrics.height()), Qt.AlignLeft | Qt.AlignTop | Qt.TextWrapAnywhere,
+                         text)
+
+        # 复制按钮
+        button = self._button_rect(option)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(QColor("#667eea"))
+        painter.drawRoundedRect(button, sp(5), sp(5))
+        painter.setFont(self.source_font)
+        painter.setPen(QColor("white"))
+        painter.drawText(button, Qt.AlignCenter, "复制译文")
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        if (event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton
+                and self._button_rect(option).contains(event.pos())):
+            record = index.data(HistoryModel.RecordRole)
+            if record is not None:
+                QApplication.clipboard().setText(record.get("result", ""))
+            return True
+        return super().editorEvent(event, model, option, index)
+
 class HistoryWindow(QWidget):
     def __init__(self):
         super().__init__()
@@ -700,104 +908,49 @@ class HistoryWindow(QWidget):
         top_bar.addWidget(clear_btn)
         self.root_layout.addLayout(top_bar)
 
-        # 滚动区域
-        from PyQt5.QtWidgets import QScrollArea
-        self.scroll = QScrollArea()
-        self.scroll.setWidgetResizable(True)
-        self.scroll_content = QWidget()
-        self.scroll_layout = QVBoxLayout(self.scroll_content)
-        self.scroll_layout.setContentsMargins(0, 0, 0, 0)
-        self.scroll_layout.setSpacing(8)
-        self.scroll_layout.addStretch()
-        self.scroll.setWidget(self.scroll_content)
-        self.root_layout.addWidget(self.scroll)
-
-    def load_and_display(self, history):
-        """加载并显示历史记录列表"""
-        # 清空旧的卡片
-        while self.scroll_layout.count() > 0:
-            item = self.scroll_layout.takeAt(0)
-            w = item.widget()
-            if w:
-                w.deleteLater()
-
-        self.count_label.setText(f"共 {len(history)} 条")
-
-        if not history:
-            empty = QLabel("暂无翻译历史记录")
-            empty.setAlignment(Qt.AlignCenter)
-            empty.setStyleSheet(f"color: #999; font-size: {sp(14)}px; padding: 40px;")
-            self.scroll_layout.addWidget(empty)
-            self.scroll_layout.addStretch()
-            return
-
-        for record in history:
-            card = self._make_card(record)
-            self.scroll_layout.addWidget(card)
-
-        self.scroll_layout.addStretch()
-
-    def _make_card(self, record):
-        """为单条历史记录创建卡片 widget"""
-        card = QWidget()
-        card.setStyleSheet("""
-            QWidget#card {
-                background: white; border: 1px solid #e0e0e0;
-                border-radius: 10px;
-            }
-            QWidget#card:hover { border-color: #667eea; }
-        """)
-        card.setObjectName("card")
-        layout = QVBoxLayout(card)
-        layout.setContentsMargins(12, 10, 12, 10)
-        layout.setSpacing(4)
-
-        # 时间 + 引擎 + 语言
-        engine_name = ENGINE_NAMES.get(record.get("engine", ""), record.get("engine", ""))
-        lang = "中文" if record.get("target_lang") == "zh-CN" else "English"
-        meta = QLabel(f"{record.get('time', '')}    {engine_name}  →  {lang}")
-        meta.setStyleSheet(f"color: #888; font-size: {sp(11)}px;")
-        layout.addWidget(meta)
-
-        # 原文
-        source = record.get("source", "")
-        if source and source != "[图片翻译]":
-            src_label = QLabel(f"原文: {source[:120]}{'...' if len(source) > 120 else ''}")
-            src_label.setWordWrap(True)
-            src_label.setStyleSheet(f"color: #555; font-size: {sp(12)}px;")
-            layout.addWidget(src_label)
-        elif source == "[图片翻译]":
-            src_label = QLabel("原文: [图片翻译]")
-            src_label.setStyleSheet(f"color: #888; font-size: {sp(12)}px; font-style: italic;")
-            layout.addWidget(src_label)
-
-        # 译文
-        result = record.get("result", "")
-        res_label = QLabel(f"译文: {result[:200]}{'...' if len(result) > 200 else ''}")
-        res_label.setWordWrap(True)
-        res_label.setStyleSheet(f"color: #2c3e50; font-size: {sp(13)}px;")
-        layout.addWidget(res_label)
-
-        # 复制按钮
-        btn_row = QHBoxLayout()
-        btn_row.addStretch()
-        copy_btn = QPushButton("复制译文")
-        copy_btn.setFixedHeight(26)
-        copy_btn.setStyleSheet("""
-            QPushButton {
-                background: #667eea; color: white; border: none;
-                border-radius: 5px; padding: 2px 12px; font-size: %dpx;
-            }
-            QPushButton:hover { background: #5568d3; }
-        """ % sp(12))
-        copy_btn.clicked.connect(lambda checked, txt=result: QApplication.clipboard().setText(txt))
-        btn_row.addWidget(copy_btn)
-        layout.addLayout(btn_row)
-
-        return card
+        # 搜索框：输入停顿后在原文和译文中搜索
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("搜索原文或译文")
+        self.search_edit.setClearButtonEnabled(True)
+        self._search_timer = QTimer(self)
+        self._search_timer.setSingleShot(True)
+        self._search_timer.setInterval(250)
+        self._search_timer.timeout.connect(self.refresh)
+        self.search_edit.textChanged.connect(self._search_timer.start)
+        self.root_layout.addWidget(self.search_edit)
+
+        # 记录列表：模型分页读取，委托只绘制可见的行
+        self.model = HistoryModel(self)
+        self.list_view = QListView()
+        self.list_view.setModel(self.model)
+        self.list_view.setItemDelegate(HistoryDelegate(self.list_view))
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.list_view.setSelectionMode(QAbstractItemView.NoSelection)
+        self.list_view.setMouseTracking(True)
+        self.list_view.doubleClicked.connect(
+            lambda index: QApplication.clipboard().setText(index.data(HistoryModel.RecordRole).get("result", "")))
+        self.root_layout.addWidget(self.list_view)
+
+        self.empty_label = QLabel("暂无翻译历史记录")
+        self.empty_label.setAlignment(Qt.AlignCenter)
+        self.empty_label.setStyleSheet(f"color: #999; font-size: {sp(14)}px; padding: 40px;")
+        self.root_layout.addWidget(self.empty_label)
+        self.empty_label.hide()
+
+    def refresh(self):
+        """按搜索框内容重新查询；只读取第一页，其余在滚动时读取"""
+        text = self.search_edit.text().strip()
+        self.model.reset(text)
+        self.count_label.setText(f"共 {self.model.total} 条")
+        empty = self.model.total == 0
+        self.empty_label.setText("没有匹配的记录" if text else "暂无翻译历史记录")
+        self.empty_label.setVisible(empty)
+        self.list_view.setVisible(not empty)
+        self.list_view.scrollToTop()
 
     def _clear_history(self):
         """清空所有历史记录"""
         from config_manager import save_history
         save_history([])
-        self.load_and_display([])
+        self.refresh()